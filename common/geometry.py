@@ -0,0 +1,105 @@
+from __future__ import annotations
+import numbers
+
+# Value types for segments and viewports shared by lab 4 and both parts of lab 5;
+# their entry scripts and test conftests put this directory on sys.path. Line and Viewport are slotted so a
+# list of millions of them stays small; LineArray keeps x1, y1, x2, y2 as contiguous
+# arrays for the vectorized clippers and rasterizers. NumPy is only imported by the
+# array helpers.
+
+class Viewport:
+    __slots__ = ('xmin', 'ymin', 'xmax', 'ymax')
+
+    def __init__(self, xmin, ymin, xmax, ymax):
+        self.xmin, self.ymin = xmin, ymin
+        self.xmax, self.ymax = xmax, ymax
+
+class Line:
+    __slots__ = ('x1', 'y1', 'x2', 'y2')
+
+    def __init__(self, x1: float, y1: float, x2: float, y2: float):
+        self.x1 = x1
+        self.y1 = y1
+        self.x2 = x2
+        self.y2 = y2
+
+# structure of arrays container for many segments
+class LineArray:
+    __slots__ = ('x1', 'y1', 'x2', 'y2')
+
+    def __init__(self, x1, y1, x2, y2):
+        import numpy as np
+        self.x1 = np.ascontiguousarray(x1, dtype=np.float64)
+        self.y1 = np.ascontiguousarray(y1, dtype=np.float64)
+        self.x2 = np.ascontiguousarray(x2, dtype=np.float64)
+        self.y2 = np.ascontiguousarray(y2, dtype=np.float64)
+
+    @classmethod
+    def from_segments(cls, segments) -> LineArray:
+        segments = as_segments(segments)
+        return cls(segments[:, 0], segments[:, 1], segments[:, 2], segments[:, 3])
+
+    def __len__(self):
+        return len(self.x1)
+
+    # an index gives a Line, a slice or mask gives a LineArray
+    def __getitem__(self, index):
+        if isinstance(index, numbers.Integral):
+            return Line(float(self.x1[index]), float(self.y1[index]), float(self.x2[index]), float(self.y2[index]))
+        return LineArray(self.x1[index], self.y1[index], self.x2[index], self.y2[index])
+
+    def __iter__(self):
+        for x1, y1, x2, y2 in zip(self.x1.tolist(), self.y1.tolist(), self.x2.tolist(), self.y2.tolist()):
+            yield Line(x1, y1, x2, y2)
+
+    # (N, 4) array of x1, y1, x2, y2 rows
+    def segments(self):
+        import numpy as np
+        return np.stack([self.x1, self.y1, self.x2, self.y2], axis=1)
+
+# (N, 4) float array from a LineArray, an array of rows or a sequence of Line like
+# objects, with x1 y1 x2 y2 or, like the lab 4 lines, start_x start_y end_x end_y
+def as_segments(lines):
+    import numpy as np
+    if isinstance(lines, LineArray):
+        return lines.segments()
+    if isinstance(lines, np.ndarray):
+        return lines.astype(np.float64, copy=False).reshape(-1, 4)
+    lines = list(lines)
+    if lines and hasattr(lines[0], 'x1'):
+        return np.array([(line.x1, line.y1, line.x2, line.y2) for line in lines], dtype=np.float64)
+    if lines and hasattr(lines[0], 'start_x'):
+        return np.array([(line.start_x, line.start_y, line.end_x, line.end_y) for line in lines], dtype=np.float64)
+    return np.asarray(lines, dtype=np.float64).reshape(-1, 4)
+
+# (xmin, ymin, xmax, ymax) over all segment end points, or None without segments; the
+# rows are reduced in chunks so a memory mapped file is paged through once
+def segment_bounds(lines, chunk_size=1 << 20):
+    import numpy as np
+    segments = lines if isinstance(lines, np.ndarray) else as_segments(lines)
+    segments = segments.reshape(-1, 4)
+    if not len(segments):
+        return None
+    bounds = []
+    for start in range(0, len(segments), chunk_size):
+        chunk = segments[start:start + chunk_size]
+        x, y = chunk[:, 0::2], chunk[:, 1::2]
+        bounds.append((x.min(), y.min(), x.max(), y.max()))
+    bounds = np.array(bounds, dtype=np.float64)
+    return (float(bounds[:, 0].min()), float(bounds[:, 1].min()), float(bounds[:, 2].max()), float(bounds[:, 3].max()))
+
+# (N, 4) xmin, ymin, xmax, ymax bounding boxes of (N, 4) x1, y1, x2, y2 segments
+def segment_boxes(segments):
+    import numpy as np
+    return np.stack([np.minimum(segments[:, 0], segments[:, 2]), np.minimum(segments[:, 1], segments[:, 3]),
+                     np.maximum(segments[:, 0], segments[:, 2]), np.maximum(segments[:, 1], segments[:, 3])], axis=1)
+
+# one (owner, cell) pair for every cell of the inclusive ranges [cx0, cx1] x [cy0, cy1]
+# of a grid with `columns` columns numbered row by row; owner is the range index
+def expand_cell_ranges(cx0, cy0, cx1, cy1, columns):
+    import numpy as np
+    width, height = cx1 - cx0 + 1, cy1 - cy0 + 1
+    count = width * height
+    owner = np.repeat(np.arange(len(count)), count)
+    step = np.arange(int(count.sum())) - np.repeat(np.cumsum(count) - count, count)
+    return owner, (cy0[owner] + step // width[owner]) * columns + cx0[owner] + step % width[owner]
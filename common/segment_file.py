@@ -0,0 +1,75 @@
+import itertools
+import struct
+import sys
+import numpy as np
+
+# Binary segment files: a fixed 64 byte header (magic, version, bytes per value,
+# segment count and the xmin ymin xmax ymax viewport) followed by count contiguous
+# little endian x1 y1 x2 y2 records of float32 or float64. float64 is the default: the
+# clippers work in float64, so a float64 file is used in place while a float32 one,
+# half the size but rounded, is converted chunk by chunk or copied whole
+MAGIC = b'SEGF'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQ4d')
+HEADER_SIZE = 64
+DTYPES = {4: np.dtype('<f4'), 8: np.dtype('<f8')}
+
+def is_segment_file(filename):
+    with open(filename, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+# (K, 4) array of K text segment rows; a row that does not hold exactly 4 values raises
+def parse_segment_rows(rows, filename):
+    try:
+        chunk = np.loadtxt(rows, dtype=np.float64, ndmin=2)
+    except ValueError as error:
+        raise ValueError(f"{filename}: segment rows must have 4 values ({error})") from error
+    if chunk.shape != (len(rows), 4):
+        raise ValueError(f"{filename}: segment rows must have 4 values")
+    return chunk
+
+def _write_header(f, count, viewport, itemsize):
+    f.seek(0)
+    f.write(HEADER.pack(MAGIC, VERSION, itemsize, count, *viewport).ljust(HEADER_SIZE, b'\0'))
+
+# write an (N, 4) segment array and a (xmin, ymin, xmax, ymax) viewport
+def write_segment_file(filename, segments, viewport, dtype=np.float64):
+    dtype = np.dtype(dtype).newbyteorder('<')
+    segments = np.ascontiguousarray(segments, dtype=dtype).reshape(-1, 4)
+    with open(filename, 'wb') as f:
+        _write_header(f, len(segments), viewport, dtype.itemsize)
+        segments.tofile(f)
+
+# convert a text line file (count, segment rows, viewport row) without holding it in memory
+def convert_text_file(text_filename, filename, dtype=np.float64, chunk_size=65536):
+    dtype = np.dtype(dtype).newbyteorder('<')
+    with open(text_filename, 'r') as text, open(filename, 'wb') as f:
+        count = int(text.readline())
+        # the header is written again once the viewport row at the end is known
+        _write_header(f, count, (0, 0, 0, 0), dtype.itemsize)
+        remaining = count
+        while remaining:
+            rows = list(itertools.islice(text, min(chunk_size, remaining)))
+            if not rows:
+                raise ValueError(f"{text_filename}: expected {remaining} more rows of 4 values")
+            parse_segment_rows(rows, text_filename).astype(dtype).tofile(f)
+            remaining -= len(rows)
+        viewport = [float(x) for x in text.readline().split()]
+        _write_header(f, count, viewport, dtype.itemsize)
+
+# map the records without reading them; returns the (N, 4) memmap and the viewport tuple
+def load_segment_file(filename):
+    with open(filename, 'rb') as f:
+        magic, version, itemsize, count, *viewport = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION or itemsize not in DTYPES:
+        raise ValueError(f"{filename}: not a version {VERSION} segment file")
+    if count == 0:
+        return np.empty((0, 4), dtype=DTYPES[itemsize]), tuple(viewport)
+    segments = np.memmap(filename, dtype=DTYPES[itemsize], mode='r', offset=HEADER_SIZE, shape=(count, 4))
+    return segments, tuple(viewport)
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (3, 4) or (len(sys.argv) == 4 and sys.argv[3] not in ('float32', 'float64')):
+        print("usage: python segment_file.py input.txt output.seg [float64|float32]")
+        sys.exit(1)
+    convert_text_file(sys.argv[1], sys.argv[2], sys.argv[3] if len(sys.argv) == 4 else np.float64)
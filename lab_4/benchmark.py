@@ -0,0 +1,134 @@
+import argparse
+import json
+import math
+import os
+import sys
+import tracemalloc
+from time import perf_counter
+import numpy as np
+# raster needs the shared common directory on the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from raster import *
+from framebuffer import Framebuffer
+
+ALGORITHMS = {name: value for name, value in vars(RasterizingAlgorithm).items() if not name.startswith('_')}
+BATCHED = (RasterizingAlgorithm.Naive, RasterizingAlgorithm.DDA, RasterizingAlgorithm.Bresenham, RasterizingAlgorithm.Wu)
+
+# angle ranges in radians for the slope distributions
+SLOPES = {
+    "uniform": lambda rng, n: rng.uniform(0, 2 * math.pi, n),
+    "shallow": lambda rng, n: rng.uniform(-math.pi / 4, math.pi / 4, n) + rng.integers(0, 2, n) * math.pi,
+    "steep": lambda rng, n: rng.uniform(math.pi / 4, 3 * math.pi / 4, n) + rng.integers(0, 2, n) * math.pi,
+    "axis": lambda rng, n: rng.integers(0, 4, n) * (math.pi / 2),
+}
+
+# (N, 4) segments of the given length starting anywhere in [-extent, extent]
+def make_segments(count, length, slope, seed=0, extent=1000):
+    rng = np.random.default_rng(seed)
+    start = rng.uniform(-extent, extent, (count, 2))
+    angle = SLOPES[slope](rng, count)
+    end = start + length * np.stack([np.cos(angle), np.sin(angle)], axis=1)
+    return np.concatenate([start, end], axis=1)
+
+# each path rasterizes all segments and returns the number of pixels produced
+def run_scalar(segments, algorithm):
+    pixels = [rasterize_line(*segment, None, algorithm) for segment in segments.tolist()]
+    return sum(len(p) for p in pixels), pixels
+
+def run_batch(segments, algorithm):
+    if algorithm == RasterizingAlgorithm.Wu:
+        result = wu_lines_batch(segments)
+    else:
+        result = rasterize_lines_batch(segments, algorithm)
+    return len(result[0]), result
+
+def run_framebuffer(segments, algorithm, framebuffer):
+    framebuffer.clear()
+    return framebuffer.draw_lines(segments, (0, 0, 0, 1.0), algorithm), framebuffer
+
+# framebuffer covering the segments plus margin cells on every side
+def make_framebuffer(segments, margin):
+    x_min, y_min = np.floor(segments.reshape(-1, 2).min(axis=0)).astype(int) - margin
+    x_max, y_max = np.ceil(segments.reshape(-1, 2).max(axis=0)).astype(int) + margin
+    return Framebuffer(x_min, y_min, x_max - x_min + 1, y_max - y_min + 1)
+
+def measure(run, repeat):
+    best = math.inf
+    for _ in range(repeat):
+        start = perf_counter()
+        pixels, result = run()
+        best = min(best, perf_counter() - start)
+        del result
+
+    # second pass under tracemalloc; allocations and retained bytes are the blocks still
+    # held by the result, Python objects and NumPy buffers alike
+    tracemalloc.start()
+    pixels, result = run()
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    held = snapshot.statistics("filename")
+
+    return {
+        "pixels": pixels,
+        "seconds": best,
+        "pixels_per_sec": pixels / best if best > 0 else None,
+        "peak_bytes": peak,
+        "allocations": sum(stat.count for stat in held),
+        "retained_bytes": sum(stat.size for stat in held),
+    }
+
+def benchmark(counts, lengths, slopes, algorithms, paths, repeat, max_pixels, seed):
+    results = []
+    for count in counts:
+        for length in lengths:
+            for slope in slopes:
+                segments = make_segments(count, length, slope, seed)
+                framebuffer = make_framebuffer(segments, int(length) + 1) if "framebuffer" in paths else None
+                for name in algorithms:
+                    algorithm = ALGORITHMS[name]
+                    for path in paths:
+                        # circles cover about 2 * pi * length pixels per segment
+                        estimate = count * length * (7 if algorithm in (RasterizingAlgorithm.Circle, RasterizingAlgorithm.Ellipse) else 1)
+                        if estimate > max_pixels[path]:
+                            continue
+                        if path == "batch" and algorithm not in BATCHED:
+                            continue
+
+                        if path == "scalar":
+                            run = lambda: run_scalar(segments, algorithm)
+                        elif path == "batch":
+                            run = lambda: run_batch(segments, algorithm)
+                        else:
+                            run = lambda: run_framebuffer(segments, algorithm, framebuffer)
+
+                        record = {"algorithm": name, "path": path, "segments": count, "length": length, "slope": slope}
+                        record.update(measure(run, repeat))
+                        results.append(record)
+                        print(f"{name:10} {path:11} n={count:<8} len={length:<5} {slope:8} {record['pixels_per_sec'] or 0:14.0f} px/s", file=sys.stderr)
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time rasterize_line and its batched and framebuffer paths")
+    parser.add_argument("--counts", type=int, nargs="+", default=[1, 10, 100, 1000, 10000, 100000, 1000000])
+    parser.add_argument("--lengths", type=float, nargs="+", default=[8, 64, 512])
+    parser.add_argument("--slopes", nargs="+", choices=list(SLOPES), default=list(SLOPES))
+    parser.add_argument("--algorithms", nargs="+", choices=list(ALGORITHMS), default=list(ALGORITHMS))
+    parser.add_argument("--paths", nargs="+", choices=["scalar", "batch", "framebuffer"], default=["scalar", "batch", "framebuffer"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-scalar-pixels", type=float, default=2e6, help="skip scalar runs expected to emit more pixels")
+    parser.add_argument("--max-pixels", type=float, default=5e7, help="skip batch and framebuffer runs expected to emit more pixels")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    max_pixels = {"scalar": args.max_scalar_pixels, "batch": args.max_pixels, "framebuffer": args.max_pixels}
+    results = benchmark(args.counts, args.lengths, args.slopes, args.algorithms, args.paths, args.repeat, max_pixels, args.seed)
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+    else:
+        print(report)
@@ -0,0 +1,226 @@
+import numpy as np
+from raster import *
+
+# convert a color given as floats in [0, 1] (matplotlib style) or as integer bytes into RGBA bytes
+def to_rgba8(color):
+    color = np.asarray(color)
+    if not np.issubdtype(color.dtype, np.integer):
+        color = np.round(color * 255)
+    if color.shape[-1] == 3:
+        alpha = np.full(color.shape[:-1] + (1,), 255)
+        color = np.concatenate([color, alpha], axis=-1)
+    return color.astype(np.uint8)
+
+# rasterize segments into flat x, y, coverage and segment id arrays. Coverage is 1
+# except for anti-aliased lines; the pixels of every segment are in emission order
+def rasterize_with_ids(segments, algorithm):
+    segments = as_segments(segments)
+    if algorithm == RasterizingAlgorithm.Wu:
+        return wu_lines_batch(segments)
+
+    if algorithm in (RasterizingAlgorithm.Naive, RasterizingAlgorithm.DDA, RasterizingAlgorithm.Bresenham):
+        xs, ys, segment_id = rasterize_lines_batch(segments, algorithm)
+        return xs, ys, np.ones(len(xs)), segment_id
+
+    xs, ys, segment_id = [], [], []
+    for i, segment in enumerate(segments):
+        pixels = rasterize_line(*segment, None, algorithm)
+        xs.extend(pixel[0] for pixel in pixels)
+        ys.extend(pixel[1] for pixel in pixels)
+        segment_id.extend([i] * len(pixels))
+    return my_round_array(xs), my_round_array(ys), np.ones(len(xs)), np.array(segment_id, dtype=np.int64)
+
+# rasterize segments into flat x, y, per pixel RGBA color and coverage arrays; colors
+# is a single color or one color per segment. Coverage is 1 except for anti-aliased lines
+def rasterize_to_arrays(segments, colors, algorithm):
+    segments = as_segments(segments)
+    colors = to_rgba8(colors)
+    if colors.ndim == 1:
+        colors = np.broadcast_to(colors, (len(segments), 4))
+
+    xs, ys, coverage, segment_id = rasterize_with_ids(segments, algorithm)
+    return xs, ys, colors[segment_id], coverage
+
+# preallocated RGBA image covering the grid cells [x_min, x_min + width) x [y_min, y_min + height)
+# that the rasterizers write into instead of building pixel lists
+class Framebuffer:
+    def __init__(self, x_min, y_min, width, height):
+        self.x_min, self.y_min = x_min, y_min
+        self.width, self.height = width, height
+        self.pixels = np.zeros((height, width, 4), dtype=np.uint8)
+
+        self.reset_clip()
+        self.clear_dirty()
+
+    # restrict writes to the cells [x0, x1] x [y0, y1]
+    def set_clip(self, x0, y0, x1, y1):
+        self.clip = (max(x0, self.x_min), max(y0, self.y_min),
+                     min(x1, self.x_min + self.width - 1), min(y1, self.y_min + self.height - 1))
+
+    def reset_clip(self):
+        self.clip = (self.x_min, self.y_min, self.x_min + self.width - 1, self.y_min + self.height - 1)
+
+    # bounding box (x0, y0, x1, y1) of the cells written since the last clear_dirty, or None
+    def dirty_region(self):
+        if self.dirty is None:
+            return None
+        return tuple(int(v) for v in self.dirty)
+
+    def clear_dirty(self):
+        self.dirty = None
+
+    def clear(self):
+        self.pixels[:] = 0
+        self.dirty = (self.x_min, self.y_min, self.x_min + self.width - 1, self.y_min + self.height - 1)
+
+    # grow the buffer to cover the cells [x0, x1] x [y0, y1], keeping its pixels; a side
+    # that grows at least doubles so repeated growth stays cheap. Returns whether the
+    # buffer was reallocated
+    def expand(self, x0, y0, x1, y1):
+        old_x1, old_y1 = self.x_min + self.width - 1, self.y_min + self.height - 1
+        if x0 >= self.x_min and y0 >= self.y_min and x1 <= old_x1 and y1 <= old_y1:
+            return False
+
+        new_x0 = min(x0, self.x_min - self.width) if x0 < self.x_min else self.x_min
+        new_y0 = min(y0, self.y_min - self.height) if y0 < self.y_min else self.y_min
+        new_x1 = max(x1, old_x1 + self.width) if x1 > old_x1 else old_x1
+        new_y1 = max(y1, old_y1 + self.height) if y1 > old_y1 else old_y1
+
+        pixels = np.zeros((new_y1 - new_y0 + 1, new_x1 - new_x0 + 1, 4), dtype=self.pixels.dtype)
+        pixels[self.y_min - new_y0:old_y1 - new_y0 + 1, self.x_min - new_x0:old_x1 - new_x0 + 1] = self.pixels
+        self.pixels = pixels
+        self.x_min, self.y_min = new_x0, new_y0
+        self.width, self.height = new_x1 - new_x0 + 1, new_y1 - new_y0 + 1
+        self.reset_clip()
+        return True
+
+    # packed 0xAABBGGRR view of the pixels (little endian)
+    def packed(self):
+        return self.pixels.view(np.uint32)[..., 0]
+
+    # extent of the image in grid coordinates, for imshow(origin='lower')
+    def extent(self):
+        return (self.x_min, self.x_min + self.width, self.y_min, self.y_min + self.height)
+
+    # write pixels at the cells xs, ys; color is a single color or one color per pixel.
+    # Coverage scales the alpha but pixels are overwritten, use FloatFramebuffer to blend
+    def plot(self, xs, ys, color, coverage=None):
+        xs, ys, color, coverage = self._clip_pixels(xs, ys, color, coverage)
+        if not len(xs):
+            return
+        if coverage is not None:
+            color = color.copy()
+            color[:, 3] = np.round(color[:, 3] * coverage)
+
+        self.pixels[ys - self.y_min, xs - self.x_min] = color
+        self._mark_dirty(xs.min(), ys.min(), xs.max(), ys.max())
+
+    def _span_color(self, color):
+        return to_rgba8(color)
+
+    # pixels inside the clip rectangle, with one RGBA color per pixel
+    def _clip_pixels(self, xs, ys, color, coverage):
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        color = to_rgba8(color)
+        if color.ndim == 1:
+            color = np.broadcast_to(color, (len(xs), 4))
+
+        x0, y0, x1, y1 = self.clip
+        inside = (xs >= x0) & (xs <= x1) & (ys >= y0) & (ys <= y1)
+        if coverage is not None:
+            coverage = np.asarray(coverage, dtype=np.float64)[inside]
+        return xs[inside], ys[inside], color[inside], coverage
+
+    # rasterize segments straight into the buffer; segments is an (N, 4) array and
+    # colors is a single color or one color per segment. Returns the number of pixels rasterized
+    def draw_lines(self, segments, colors, algorithm):
+        xs, ys, colors, coverage = rasterize_to_arrays(segments, colors, algorithm)
+        self.plot(xs, ys, colors, coverage)
+        return len(xs)
+
+    # fill horizontal spans (y, x_start, x_end) such as filled_circle_spans output
+    def fill_spans(self, spans, color):
+        color = self._span_color(color)
+        x0, y0, x1, y1 = self.clip
+        for y, x_start, x_end in spans:
+            x_start, x_end = max(x_start, x0), min(x_end, x1)
+            if y < y0 or y > y1 or x_start > x_end:
+                continue
+            self.pixels[y - self.y_min, x_start - self.x_min:x_end - self.x_min + 1] = color
+            self._mark_dirty(x_start, y, x_end, y)
+
+    def draw_line(self, start_x, start_y, end_x, end_y, color, algorithm):
+        return self.draw_lines([[start_x, start_y, end_x, end_y]], color, algorithm)
+
+    def _mark_dirty(self, x0, y0, x1, y1):
+        if self.dirty is not None:
+            dx0, dy0, dx1, dy1 = self.dirty
+            x0, y0, x1, y1 = min(x0, dx0), min(y0, dy0), max(x1, dx1), max(y1, dy1)
+        self.dirty = (x0, y0, x1, y1)
+
+# premultiplied float RGBA buffer; pixels are blended with the over operator, so
+# partial coverage from anti-aliased lines composes correctly
+class FloatFramebuffer(Framebuffer):
+    def __init__(self, x_min, y_min, width, height):
+        super().__init__(x_min, y_min, width, height)
+        self.pixels = np.zeros((height, width, 4), dtype=np.float32)
+
+    def plot(self, xs, ys, color, coverage=None):
+        xs, ys, color, coverage = self._clip_pixels(xs, ys, color, coverage)
+        if not len(xs):
+            return
+
+        color = color / 255.0
+        alpha = color[:, 3] if coverage is None else color[:, 3] * coverage
+        rgb = color[:, :3] * alpha[:, None]
+        index = (ys - self.y_min) * self.width + (xs - self.x_min)
+
+        # a pixel hit several times is blended once per layer, in emission order
+        order = np.argsort(index, kind="stable")
+        sorted_index = index[order]
+        first = np.ones(len(index), dtype=bool)
+        first[1:] = sorted_index[1:] != sorted_index[:-1]
+        group_start = np.maximum.accumulate(np.where(first, np.arange(len(index)), 0))
+        layer = np.empty(len(index), dtype=np.int64)
+        layer[order] = np.arange(len(index)) - group_start
+
+        # sort once by layer so every pass blends a contiguous slice; deep layers hold
+        # only the few pixels hit that often, so the work stays close to one pass
+        by_layer = np.argsort(layer, kind="stable")
+        bounds = np.searchsorted(layer[by_layer], np.arange(layer.max() + 2))
+        flat = self.pixels.reshape(-1, 4)
+        for current in range(len(bounds) - 1):
+            piece = by_layer[bounds[current]:bounds[current + 1]]
+            target, a = index[piece], alpha[piece]
+            flat[target, :3] = rgb[piece] + flat[target, :3] * (1 - a)[:, None]
+            flat[target, 3] = a + flat[target, 3] * (1 - a)
+        self._mark_dirty(xs.min(), ys.min(), xs.max(), ys.max())
+
+    # spans overwrite the pixels they cover
+    def _span_color(self, color):
+        color = to_rgba8(color) / 255.0
+        return np.concatenate([color[:3] * color[3], color[3:]])
+
+    # straight alpha RGBA bytes for display, of the whole buffer or of the cells
+    # [x0, x1] x [y0, y1] of a region such as dirty_region()
+    def to_image(self, region=None):
+        pixels = self.pixels
+        if region is not None:
+            x0, y0, x1, y1 = region
+            pixels = pixels[y0 - self.y_min:y1 - self.y_min + 1, x0 - self.x_min:x1 - self.x_min + 1]
+        return straight_rgba8(pixels)
+
+# straight alpha RGBA bytes of premultiplied float pixels
+def straight_rgba8(pixels):
+    alpha = pixels[..., 3:]
+    rgb = np.divide(pixels[..., :3], alpha, out=np.zeros_like(pixels[..., :3]), where=alpha > 0)
+    return np.round(np.concatenate([rgb, alpha], axis=-1) * 255).astype(np.uint8)
+
+# halve premultiplied float pixels by averaging 2 x 2 blocks of cells, which is the
+# coverage weighted color of the block; odd sides are padded with transparent cells
+def downsample(pixels):
+    height, width = pixels.shape[:2]
+    padded = np.zeros(((height + 1) // 2 * 2, (width + 1) // 2 * 2, 4), dtype=pixels.dtype)
+    padded[:height, :width] = pixels
+    return padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2, 4).mean(axis=(1, 3))
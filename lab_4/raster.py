@@ -1,17 +1,61 @@
-from decimal import Decimal, ROUND_HALF_UP, ROUND_FLOOR, ROUND_CEILING
-import numpy as np
 import math
+from geometry import as_segments
+
+# rounding modes, same values as the decimal module constants. NumPy and decimal
+# are imported inside the functions that need them so importing this module stays cheap
+ROUND_HALF_UP = 'ROUND_HALF_UP'
+ROUND_FLOOR = 'ROUND_FLOOR'
+ROUND_CEILING = 'ROUND_CEILING'
+
 # Enum for rasterizing algorithms
 class RasterizingAlgorithm:
     Naive = 0
     DDA = 1
     Bresenham = 2
     Circle = 3
+    Ellipse = 4
+    Wu = 5
 
+# rounding matches Decimal.to_integral_value, but the common modes avoid
+# building a Decimal for every pixel
 def my_round(x, rounding = ROUND_HALF_UP):
+    if rounding == ROUND_HALF_UP:
+        # ties go away from zero; magnitude - floor is exact for floats
+        magnitude = abs(x)
+        rounded = math.floor(magnitude)
+        if magnitude - rounded >= 0.5:
+            rounded += 1
+        return rounded if x >= 0 else -rounded
+    elif rounding == ROUND_FLOOR:
+        return math.floor(x)
+    elif rounding == ROUND_CEILING:
+        return math.ceil(x)
+    from decimal import Decimal
     return int(Decimal(x).to_integral_value(rounding=rounding))
 
+# vectorized my_round for NumPy arrays, returns int64
+def my_round_array(values, rounding = ROUND_HALF_UP):
+    import numpy as np
+    values = np.asarray(values, dtype=np.float64)
+    if rounding == ROUND_HALF_UP:
+        magnitude = np.abs(values)
+        rounded = np.floor(magnitude)
+        rounded += magnitude - rounded >= 0.5
+        rounded = np.copysign(rounded, values)
+    elif rounding == ROUND_FLOOR:
+        rounded = np.floor(values)
+    elif rounding == ROUND_CEILING:
+        rounded = np.ceil(values)
+    else:
+        rounded = np.array([my_round(x, rounding) for x in values.ravel()], dtype=np.float64).reshape(values.shape)
+    return rounded.astype(np.int64)
+
 def rasterize_line(start_x, start_y, end_x, end_y, color, algorithm):
+    # anti-aliased pixels are (x, y, color, coverage) and use the unrounded endpoints
+    if algorithm == RasterizingAlgorithm.Wu:
+        xs, ys, coverage, _ = wu_lines_batch([[start_x, start_y, end_x, end_y]])
+        return list(zip(xs.tolist(), ys.tolist(), [color] * len(xs), coverage.tolist()))
+
     start_x, start_y = my_round(start_x), my_round(start_y)
     end_x, end_y = my_round(end_x), my_round(end_y)
 
@@ -20,34 +64,34 @@ def rasterize_line(start_x, start_y, end_x, end_y, color, algorithm):
     
     filled_pixels = []
     if algorithm == RasterizingAlgorithm.Naive:
-        start = [start_x, start_y]
-        end = [end_x, end_y]
-        if start[0] > end[0]:
-            start[0], end[0] = end[0], start[0]
-        if start[1] > end[1]:
-            start[1], end[1] = end[1], start[1]
-
-        if (start[1] == end[1]):
-            return [(x, start[1], color) for x in range(start[0], end[0] + 1, 1)]
-        elif (start[0] == end[0]):
-            return [(start[0], y, color) for y in range(start[1], end[1] + 1, 1)]
-
-        for x in np.arange(start[0], end[0] + 1, 0.33):
-            y = start_y + (dy / dx) * (x - start_x)
-            filled_pixels.append((my_round(x, ROUND_FLOOR), my_round(y), color))
+        import numpy as np
+        # one pixel per step along the dominant axis, the other coordinate
+        # comes from the line equation
+        steps = np.arange(max(abs(dx), abs(dy)) + 1)
+        if abs(dx) >= abs(dy):
+            x = start_x + np.sign(dx) * steps
+            y = my_round_array(start_y + (dy / dx if dx else 0) * (x - start_x))
+        else:
+            y = start_y + np.sign(dy) * steps
+            x = my_round_array(start_x + (dx / dy) * (y - start_y))
+        filled_pixels = list(zip(x.tolist(), y.tolist(), [color] * len(steps)))
 
     elif algorithm == RasterizingAlgorithm.DDA:
+        import numpy as np
         steps = max(abs(dx), abs(dy))
+        # zero length lines emit nothing, like _dda_batch
+        if steps == 0:
+            return []
         x_increment = dx / steps
         y_increment = dy / steps
 
-        x = start_x
-        y = start_y
-
-        for _ in range(steps):
-            filled_pixels.append((my_round(x), my_round(y), color))
-            x += x_increment
-            y += y_increment
+        # accumulate is sequential, so the positions match repeated x += x_increment
+        x = np.full(steps, x_increment)
+        y = np.full(steps, y_increment)
+        x[0], y[0] = start_x, start_y
+        x = my_round_array(np.add.accumulate(x)).tolist()
+        y = my_round_array(np.add.accumulate(y)).tolist()
+        filled_pixels = list(zip(x, y, [color] * steps))
 
     elif algorithm == RasterizingAlgorithm.Bresenham:
         # Setup initial conditions
@@ -93,33 +137,304 @@ def rasterize_line(start_x, start_y, end_x, end_y, color, algorithm):
             filled_pixels.reverse()
 
     elif algorithm == RasterizingAlgorithm.Circle:
-        x0 = start_x
-        y0 = start_y
-        radius = math.sqrt(abs(end_x - start_x)**2 + abs(end_y - start_y)**2)
-
-        x = radius
-        y = 0
-        err = 0
-
-        while x >= y:
-            filled_pixels.append((x0 + x, y0 + y, color))
-            filled_pixels.append((x0 + y, y0 + x, color))
-            filled_pixels.append((x0 - y, y0 + x, color))
-            filled_pixels.append((x0 - x, y0 + y, color))
-            filled_pixels.append((x0 - x, y0 - y, color))
-            filled_pixels.append((x0 - y, y0 - x, color))
-            filled_pixels.append((x0 + y, y0 - x, color))
-            filled_pixels.append((x0 + x, y0 - y, color))
-
-            y += 1
-            err += 1 + 2*y
-            if 2*(err-x) + 1 > 0:
-                x -= 1
-                err += 1 - 2*x
+        radius = my_round(math.sqrt(dx**2 + dy**2))
+        filled_pixels = [(x, y, color) for x, y in midpoint_circle(start_x, start_y, radius)]
+
+    elif algorithm == RasterizingAlgorithm.Ellipse:
+        filled_pixels = [(x, y, color) for x, y in midpoint_ellipse(start_x, start_y, abs(dx), abs(dy))]
 
     return filled_pixels
 
 
-for i in range(1, 15, 2):
-    n = i / 2
-    print(n, "=>", my_round(n))
\ No newline at end of file
+# integer midpoint circle around (xc, yc); every outline pixel appears once
+def midpoint_circle(xc, yc, radius):
+    octant = []
+    x, y = radius, 0
+    d = 1 - radius
+    while x >= y:
+        octant.append((x, y))
+        y += 1
+        if d < 0:
+            d += 2*y + 1
+        else:
+            x -= 1
+            d += 2*(y - x) + 1
+
+    # mirror the octant into the other seven, dict drops the points on the octant borders
+    points = {}
+    for sx, sy, swap in ((1, 1, False), (1, 1, True), (-1, 1, True), (-1, 1, False),
+                         (-1, -1, False), (-1, -1, True), (1, -1, True), (1, -1, False)):
+        for x, y in octant:
+            if swap:
+                x, y = y, x
+            points[(xc + sx*x, yc + sy*y)] = None
+    return list(points)
+
+# integer midpoint ellipse with semi axes rx, ry, aligned with the grid
+def midpoint_ellipse(xc, yc, rx, ry):
+    rx2, ry2 = rx*rx, ry*ry
+    quadrant = []
+    x, y = 0, ry
+
+    # region 1, slope above -1; decision values are scaled by 4 to stay integer
+    d = 4*ry2 - 4*rx2*ry + rx2
+    dx, dy = 0, 2*rx2*y
+    while dx < dy:
+        quadrant.append((x, y))
+        x += 1
+        dx += 2*ry2
+        if d < 0:
+            d += 4*(dx + ry2)
+        else:
+            y -= 1
+            dy -= 2*rx2
+            d += 4*(dx - dy + ry2)
+
+    # region 2, slope below -1
+    d = ry2*(2*x + 1)**2 + 4*rx2*(y - 1)**2 - 4*rx2*ry2
+    while y >= 0:
+        quadrant.append((x, y))
+        y -= 1
+        dy -= 2*rx2
+        if d > 0:
+            d += 4*(rx2 - dy)
+        else:
+            x += 1
+            dx += 2*ry2
+            d += 4*(dx - dy + rx2)
+
+    # flat ellipses can leave region 2 before reaching x = rx
+    last_x = quadrant[-1][0]
+    quadrant.extend((x, 0) for x in range(last_x + 1, rx + 1))
+
+    points = {}
+    for sx, sy in ((1, 1), (-1, 1), (-1, -1), (1, -1)):
+        for x, y in quadrant:
+            points[(xc + sx*x, yc + sy*y)] = None
+    return list(points)
+
+# horizontal spans (y, x_start, x_end) covering a shape whose outline is symmetric
+# around the vertical line through xc
+def _outline_spans(xc, outline):
+    half_width = {}
+    for x, y in outline:
+        half_width[y] = max(half_width.get(y, 0), x - xc)
+    return [(y, xc - w, xc + w) for y, w in sorted(half_width.items())]
+
+# filled disk as one span per row
+def filled_circle_spans(xc, yc, radius):
+    return _outline_spans(xc, midpoint_circle(xc, yc, radius))
+
+# filled ellipse as one span per row
+def filled_ellipse_spans(xc, yc, rx, ry):
+    return _outline_spans(xc, midpoint_ellipse(xc, yc, rx, ry))
+
+# rasterize many segments in one array pass; segments is an (N, 4) array of
+# start_x, start_y, end_x, end_y rows, a LineArray or a list of Lines. Returns flat x, y and segment_id arrays
+# in the same order the scalar rasterize_line emits pixels for each segment.
+def rasterize_lines_batch(segments, algorithm):
+    import numpy as np
+    segments = as_segments(segments)
+    coords = my_round_array(segments)
+    start_x, start_y, end_x, end_y = coords.T
+
+    if algorithm == RasterizingAlgorithm.Naive:
+        return _naive_batch(start_x, start_y, end_x, end_y)
+    elif algorithm == RasterizingAlgorithm.DDA:
+        return _dda_batch(start_x, start_y, end_x, end_y)
+    elif algorithm == RasterizingAlgorithm.Bresenham:
+        return _bresenham_batch(start_x, start_y, end_x, end_y)
+    raise ValueError(f"Batch rasterization is not supported for algorithm {algorithm}")
+
+# drop repeated pixels from a rasterize_line result, keeping the first occurrence;
+# useful when combining the output of several algorithms
+def dedup_pixels(pixels):
+    unique = {}
+    for pixel in pixels:
+        unique.setdefault((pixel[0], pixel[1]), pixel)
+    return list(unique.values())
+
+# indices of the first occurrence of every distinct (x, y) pair, in order
+def unique_pixel_indices(xs, ys):
+    import numpy as np
+    xs = np.asarray(xs, dtype=np.int64)
+    ys = np.asarray(ys, dtype=np.int64)
+    _, first = np.unique(np.stack([xs, ys], axis=1), axis=0, return_index=True)
+    return np.sort(first)
+
+# start offset of every segment in the flat output arrays
+def _segment_offsets(counts):
+    import numpy as np
+    offsets = np.zeros(len(counts), dtype=np.int64)
+    np.cumsum(counts[:-1], out=offsets[1:])
+    return offsets
+
+def _naive_batch(start_x, start_y, end_x, end_y):
+    import numpy as np
+    dx = end_x - start_x
+    dy = end_y - start_y
+    x_major = np.abs(dx) >= np.abs(dy)
+
+    counts = np.maximum(np.abs(dx), np.abs(dy)) + 1
+    segment_id = np.repeat(np.arange(len(counts)), counts)
+    step = np.arange(int(counts.sum())) - _segment_offsets(counts)[segment_id]
+
+    # same expression as the scalar branch, evaluated for every pixel at once
+    major = x_major[segment_id]
+    seg_dx, seg_dy = dx[segment_id], dy[segment_id]
+    offset = np.where(major, np.sign(seg_dx), np.sign(seg_dy)) * step
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(major, seg_dy / np.where(seg_dx, seg_dx, 1), seg_dx / np.where(seg_dy, seg_dy, 1))
+    minor = my_round_array(np.where(major, start_y[segment_id], start_x[segment_id]) + slope * offset)
+
+    out_x = np.where(major, start_x[segment_id] + offset, minor)
+    out_y = np.where(major, minor, start_y[segment_id] + offset)
+    return out_x, out_y, segment_id
+
+def _dda_batch(start_x, start_y, end_x, end_y):
+    import numpy as np
+    dx = end_x - start_x
+    dy = end_y - start_y
+    steps = np.maximum(np.abs(dx), np.abs(dy))
+
+    # zero length segments emit nothing
+    valid = steps > 0
+    safe_steps = np.where(valid, steps, 1)
+    x_increment = dx / safe_steps
+    y_increment = dy / safe_steps
+
+    total = int(steps.sum())
+    out_x = np.empty(total, dtype=np.int64)
+    out_y = np.empty(total, dtype=np.int64)
+    segment_id = np.repeat(np.arange(len(steps)), steps)
+    offsets = _segment_offsets(steps)
+
+    # step all segments together, longest first, so every segment accumulates
+    # its increments in the same order as the scalar loop
+    order = np.argsort(-steps, kind="stable")
+    sorted_steps = steps[order]
+    x = start_x[order].astype(np.float64)
+    y = start_y[order].astype(np.float64)
+    x_increment = x_increment[order]
+    y_increment = y_increment[order]
+    offsets = offsets[order]
+
+    active = len(order)
+    for step in range(int(sorted_steps[0]) if active else 0):
+        while active and sorted_steps[active - 1] <= step:
+            active -= 1
+        index = offsets[:active] + step
+        out_x[index] = my_round_array(x[:active])
+        out_y[index] = my_round_array(y[:active])
+        x[:active] += x_increment[:active]
+        y[:active] += y_increment[:active]
+
+    return out_x, out_y, segment_id
+
+def _bresenham_batch(start_x, start_y, end_x, end_y):
+    import numpy as np
+    # Rotate steep lines
+    is_steep = np.abs(end_y - start_y) > np.abs(end_x - start_x)
+    x1 = np.where(is_steep, start_y, start_x)
+    y1 = np.where(is_steep, start_x, start_y)
+    x2 = np.where(is_steep, end_y, end_x)
+    y2 = np.where(is_steep, end_x, end_y)
+
+    # Swap start and end points if necessary and store swap state
+    swapped = x1 > x2
+    x1, x2 = np.where(swapped, x2, x1), np.where(swapped, x1, x2)
+    y1, y2 = np.where(swapped, y2, y1), np.where(swapped, y1, y2)
+
+    dx = x2 - x1
+    dy = np.abs(y2 - y1)
+    error = dx // 2
+    ystep = np.where(y1 < y2, 1, -1)
+
+    counts = dx + 1
+    segment_id = np.repeat(np.arange(len(counts)), counts)
+    offsets = _segment_offsets(counts)
+    step = np.arange(int(counts.sum())) - offsets[segment_id]
+
+    # the error term stays in [0, dx), so the number of y steps taken before
+    # pixel k is ceil((k * dy - error) / dx)
+    seg_dx = dx[segment_id]
+    y_steps = -((error[segment_id] - step * dy[segment_id]) // np.maximum(seg_dx, 1))
+    x = x1[segment_id] + step
+    y = y1[segment_id] + ystep[segment_id] * y_steps
+
+    steep = is_steep[segment_id]
+    out_x = np.where(steep, y, x)
+    out_y = np.where(steep, x, y)
+
+    # Reverse the pixels of the swapped segments
+    position = np.where(swapped[segment_id], offsets[segment_id] + counts[segment_id] - 1 - step, offsets[segment_id] + step)
+    result_x = np.empty_like(out_x)
+    result_y = np.empty_like(out_y)
+    result_x[position] = out_x
+    result_y[position] = out_y
+
+    return result_x, result_y, segment_id
+
+
+# Xiaolin Wu anti-aliased lines for an (N, 4) segment array. Returns flat x, y,
+# coverage and segment_id arrays; pixels with zero coverage are dropped
+def wu_lines_batch(segments):
+    import numpy as np
+    segments = as_segments(segments)
+    x0, y0, x1, y1 = segments.T
+
+    # Rotate steep lines and make them run left to right
+    steep = np.abs(y1 - y0) > np.abs(x1 - x0)
+    x0, y0 = np.where(steep, y0, x0), np.where(steep, x0, y0)
+    x1, y1 = np.where(steep, y1, x1), np.where(steep, x1, y1)
+    swapped = x0 > x1
+    x0, x1 = np.where(swapped, x1, x0), np.where(swapped, x0, x1)
+    y0, y1 = np.where(swapped, y1, y0), np.where(swapped, y0, y1)
+
+    dx = x1 - x0
+    gradient = np.where(dx != 0, (y1 - y0) / np.where(dx != 0, dx, 1), 1.0)
+
+    # end points, each split over the two pixels around the line
+    xend1 = np.floor(x0 + 0.5)
+    yend1 = y0 + gradient * (xend1 - x0)
+    xgap1 = 1 - (x0 + 0.5 - np.floor(x0 + 0.5))
+    xend2 = np.floor(x1 + 0.5)
+    yend2 = y1 + gradient * (xend2 - x1)
+    xgap2 = x1 + 0.5 - np.floor(x1 + 0.5)
+
+    end_major = np.stack([xend1, xend1, xend2, xend2], axis=1)
+    end_minor = np.stack([np.floor(yend1), np.floor(yend1) + 1, np.floor(yend2), np.floor(yend2) + 1], axis=1)
+    fpart1, fpart2 = yend1 - np.floor(yend1), yend2 - np.floor(yend2)
+    end_coverage = np.stack([(1 - fpart1) * xgap1, fpart1 * xgap1, (1 - fpart2) * xgap2, fpart2 * xgap2], axis=1)
+
+    # interior columns, two pixels each
+    interior = np.maximum(xend2 - xend1 - 1, 0).astype(np.int64)
+    inner_id = np.repeat(np.arange(len(segments)), interior)
+    step = np.arange(int(interior.sum())) - _segment_offsets(interior)[inner_id]
+    intery = yend1[inner_id] + gradient[inner_id] * (step + 1)
+    inner_major = np.repeat(xend1[inner_id] + 1 + step, 2)
+    inner_minor = np.stack([np.floor(intery), np.floor(intery) + 1], axis=1).ravel()
+    fpart = intery - np.floor(intery)
+    inner_coverage = np.stack([1 - fpart, fpart], axis=1).ravel()
+
+    # lay out every segment as its four end pixels followed by its interior pixels
+    counts = 4 + 2 * interior
+    offsets = _segment_offsets(counts)
+    end_position = (offsets[:, None] + np.arange(4)).ravel()
+    inner_position = np.repeat(offsets[inner_id] + 4 + 2 * step, 2) + np.tile([0, 1], len(step))
+
+    total = int(counts.sum())
+    major = np.empty(total)
+    minor = np.empty(total)
+    coverage = np.empty(total)
+    major[end_position], major[inner_position] = end_major.ravel(), inner_major
+    minor[end_position], minor[inner_position] = end_minor.ravel(), inner_minor
+    coverage[end_position], coverage[inner_position] = end_coverage.ravel(), inner_coverage
+    segment_id = np.repeat(np.arange(len(segments)), counts)
+
+    is_steep = steep[segment_id]
+    out_x = np.where(is_steep, minor, major).astype(np.int64)
+    out_y = np.where(is_steep, major, minor).astype(np.int64)
+
+    visible = coverage > 0
+    return out_x[visible], out_y[visible], coverage[visible], segment_id[visible]
@@ -0,0 +1,149 @@
+import numpy as np
+from framebuffer import FloatFramebuffer, rasterize_with_ids, to_rgba8, downsample
+from geometry import as_segments
+
+# The scene keeps every drawn line and one raster layer per algorithm. A layer caches
+# the pixels of each line it has rasterized and blends them, in line order, into its
+# own framebuffer, so adding lines only rasterizes and blends the new ones and
+# switching algorithms shows a layer that is already built. Bringing a layer up to date
+# may run on a worker thread; the layer belongs to that thread until it returns.
+
+class RasterLayer:
+    def __init__(self, algorithm):
+        self.algorithm = algorithm
+        # (xs, ys, color, coverage) of every line, None for lines to rasterize again
+        self.pixels = []
+        self.stale = set()
+        # the lines [0, composited) are blended into the framebuffer
+        self.composited = 0
+        self.framebuffer = None
+        # straight alpha image of the framebuffer and the cells holding pixels
+        self.image = None
+        self.bounds = None
+        # premultiplied framebuffer halved once per level, built when first shown
+        self.levels = []
+
+    # a line changed; blending can not be undone, so a changed line that is already
+    # in the framebuffer makes the layer blend everything again
+    def invalidate(self, index):
+        if index < len(self.pixels):
+            self.pixels[index] = None
+            self.stale.add(index)
+        if index < self.composited:
+            self.composited = 0
+
+    # rasterize the lines without cached pixels, in chunks of chunk_size lines run in
+    # this thread or submitted to an executor such as a process pool. progress(done,
+    # total) is called after every chunk; once cancelled() is true the remaining lines
+    # stay stale and False is returned
+    def rasterize(self, lines, progress=None, cancelled=None, executor=None, chunk_size=1024):
+        missing = sorted(self.stale) + list(range(len(self.pixels), len(lines)))
+        self.stale.clear()
+        self.pixels.extend([None] * (len(lines) - len(self.pixels)))
+
+        chunks = [missing[start:start + chunk_size] for start in range(0, len(missing), chunk_size)]
+        segments = [as_segments([lines[i] for i in chunk]) for chunk in chunks]
+        if executor is not None:
+            futures = [executor.submit(rasterize_with_ids, chunk_segments, self.algorithm) for chunk_segments in segments]
+
+        done = 0
+        for k, chunk in enumerate(chunks):
+            if cancelled is not None and cancelled():
+                if executor is not None:
+                    for future in futures[k:]:
+                        future.cancel()
+                self.stale.update(i for chunk in chunks[k:] for i in chunk)
+                return False
+
+            if executor is not None:
+                xs, ys, coverage, segment_id = futures[k].result()
+            else:
+                xs, ys, coverage, segment_id = rasterize_with_ids(segments[k], self.algorithm)
+            colors = to_rgba8([lines[i].color for i in chunk])
+
+            # split the chunk per line, keeping the emission order inside every line
+            order = np.argsort(segment_id, kind="stable")
+            starts = np.searchsorted(segment_id[order], np.arange(len(chunk) + 1))
+            for j, i in enumerate(chunk):
+                piece = order[starts[j]:starts[j + 1]]
+                self.pixels[i] = (xs[piece], ys[piece], colors[j], coverage[piece])
+
+            done += len(chunk)
+            if progress is not None:
+                progress(done, len(missing))
+        return True
+
+    # blend the lines [composited, count) into the framebuffer and refresh the part of
+    # the image they touched
+    def composite(self, count):
+        if self.composited == 0:
+            self.framebuffer = self.image = self.bounds = None
+            self.levels = []
+        pieces = self.pixels[self.composited:count]
+        self.composited = count
+        pieces = [piece for piece in pieces if len(piece[0])]
+        if not pieces:
+            return
+        self.levels = []
+
+        xs = np.concatenate([piece[0] for piece in pieces])
+        ys = np.concatenate([piece[1] for piece in pieces])
+        colors = np.repeat(np.array([piece[2] for piece in pieces]), [len(piece[0]) for piece in pieces], axis=0)
+        coverage = np.concatenate([piece[3] for piece in pieces])
+        x0, y0, x1, y1 = int(xs.min()), int(ys.min()), int(xs.max()), int(ys.max())
+
+        if self.framebuffer is None:
+            self.framebuffer = FloatFramebuffer(x0, y0, x1 - x0 + 1, y1 - y0 + 1)
+            resized = True
+        else:
+            resized = self.framebuffer.expand(x0, y0, x1, y1)
+            bx0, by0, bx1, by1 = self.bounds
+            x0, y0, x1, y1 = min(x0, bx0), min(y0, by0), max(x1, bx1), max(y1, by1)
+        self.bounds = (x0, y0, x1, y1)
+
+        self.framebuffer.clear_dirty()
+        self.framebuffer.plot(xs, ys, colors, coverage)
+        if resized:
+            self.image = self.framebuffer.to_image()
+        else:
+            dx0, dy0, dx1, dy1 = self.framebuffer.dirty_region()
+            fx, fy = self.framebuffer.x_min, self.framebuffer.y_min
+            self.image[dy0 - fy:dy1 - fy + 1, dx0 - fx:dx1 - fx + 1] = self.framebuffer.to_image((dx0, dy0, dx1, dy1))
+
+    # framebuffer pixels aggregated over 2**level x 2**level cells
+    def level(self, level):
+        if level == 0:
+            return self.framebuffer.pixels
+        while len(self.levels) < level:
+            self.levels.append(downsample(self.levels[-1] if self.levels else self.framebuffer.pixels))
+        return self.levels[level - 1]
+
+class Scene:
+    def __init__(self):
+        self.lines = []
+        self.layers = {}
+
+    def add_lines(self, lines):
+        self.lines.extend(lines)
+
+    def replace_line(self, index, line):
+        self.lines[index] = line
+        for layer in self.layers.values():
+            layer.invalidate(index)
+
+    def clear(self):
+        self.lines = []
+        self.layers = {}
+
+    # the layer of an algorithm brought up to date with the scene; only the lines it
+    # has no pixels for are rasterized. The arguments are passed on to
+    # RasterLayer.rasterize; returns None when cancelled
+    def layer(self, algorithm, progress=None, cancelled=None, executor=None):
+        lines = list(self.lines)
+        if algorithm not in self.layers:
+            self.layers[algorithm] = RasterLayer(algorithm)
+        layer = self.layers[algorithm]
+        if not layer.rasterize(lines, progress, cancelled, executor):
+            return None
+        layer.composite(len(lines))
+        return layer
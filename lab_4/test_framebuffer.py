@@ -0,0 +1,18 @@
+import numpy as np
+from framebuffer import FloatFramebuffer
+
+# repeated pixels blend in emission order, the same as plotting them one at a time
+def test_plot_blends_repeated_pixels_in_order():
+    rng = np.random.default_rng(0)
+    count = 2000
+    xs, ys = rng.integers(0, 4, count), rng.integers(0, 3, count)
+    colors = rng.integers(0, 256, (count, 4)).astype(np.uint8)
+    coverage = rng.uniform(0, 1, count)
+
+    batch = FloatFramebuffer(0, 0, 4, 3)
+    batch.plot(xs, ys, colors, coverage)
+    single = FloatFramebuffer(0, 0, 4, 3)
+    for i in range(count):
+        single.plot(xs[i:i + 1], ys[i:i + 1], colors[i:i + 1], coverage[i:i + 1])
+    assert np.array_equal(batch.pixels, single.pixels)
+    assert batch.dirty_region() == (0, 0, 3, 2)
@@ -0,0 +1,106 @@
+import math
+import os
+import subprocess
+import sys
+from decimal import Decimal
+import numpy as np
+import pytest
+import geometry
+from raster import *
+
+# seconds a cold import of raster may take
+IMPORT_BUDGET = 0.05
+
+MODES = [ROUND_HALF_UP, ROUND_FLOOR, ROUND_CEILING]
+
+# ties, values just below a tie, signed zeros and magnitudes where floats have no
+# fractional bits left
+VALUES = (
+    [k + 0.5 for k in range(-10, 10)]
+    + [math.nextafter(0.5, 0), math.nextafter(-0.5, 0), math.nextafter(1.5, 0), math.nextafter(-1.5, 0)]
+    + [math.nextafter(0.5, 1), math.nextafter(-0.5, -1)]
+    + [0.0, -0.0, 0.49999999999999994, 1e-300, -1e-300, 2.3, -2.3, 2.7, -2.7]
+    + [2.0 ** 52 - 0.5, -(2.0 ** 52 - 0.5), 2.0 ** 52 + 1, 2.0 ** 53, -(2.0 ** 53), 1e15 + 0.5, -1e15 - 0.5, 2.0 ** 62]
+)
+HUGE = [1e300, -1e300, 2.0 ** 80 + 2.0 ** 28]
+
+def reference(x, rounding):
+    return int(Decimal(x).to_integral_value(rounding=rounding))
+
+@pytest.mark.parametrize("rounding", MODES)
+def test_my_round_matches_decimal(rounding):
+    for x in VALUES + HUGE:
+        assert my_round(x, rounding) == reference(x, rounding), x
+
+@pytest.mark.parametrize("rounding", MODES)
+def test_my_round_array_matches_decimal(rounding):
+    rounded = my_round_array(np.array(VALUES), rounding)
+    assert rounded.dtype == np.int64
+    assert rounded.tolist() == [reference(x, rounding) for x in VALUES]
+
+@pytest.mark.parametrize("rounding", MODES)
+def test_my_round_array_random(rounding):
+    values = np.random.default_rng(0).uniform(-1e6, 1e6, 10000)
+    values[::2] = np.floor(values[::2]) + 0.5
+    assert my_round_array(values, rounding).tolist() == [reference(x, rounding) for x in values.tolist()]
+
+def test_my_round_other_modes_use_decimal():
+    from decimal import ROUND_HALF_EVEN
+    assert my_round(2.5, ROUND_HALF_EVEN) == 2
+    assert my_round_array([0.5, 1.5, -2.5], ROUND_HALF_EVEN).tolist() == [0, 2, -2]
+
+@pytest.mark.parametrize("algorithm", [RasterizingAlgorithm.Naive, RasterizingAlgorithm.DDA, RasterizingAlgorithm.Bresenham])
+def test_zero_length_line_matches_batch(algorithm):
+    pixels = rasterize_line(3.2, 4.4, 3.2, 4.4, None, algorithm)
+    xs, ys = rasterize_lines_batch([[3.2, 4.4, 3.2, 4.4]], algorithm)[:2]
+    assert [(x, y) for x, y, _ in pixels] == list(zip(xs.tolist(), ys.tolist()))
+
+# random segments with half integer, axis aligned and zero length ones mixed in
+def random_segments(count=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    segments = rng.uniform(-60, 60, (count, 4))
+    segments[0::5] = np.round(segments[0::5]) + 0.5
+    segments[1::5, 2] = segments[1::5, 0]
+    segments[2::5, 3] = segments[2::5, 1]
+    segments[3::10, 2:] = segments[3::10, :2]
+    return segments
+
+# the batch rasterizer emits the pixels of rasterize_line, segment by segment in order
+@pytest.mark.parametrize("algorithm", [RasterizingAlgorithm.Naive, RasterizingAlgorithm.DDA, RasterizingAlgorithm.Bresenham])
+def test_batch_matches_rasterize_line(algorithm):
+    segments = random_segments()
+    xs, ys, segment_id = rasterize_lines_batch(segments, algorithm)
+    expected = [(x, y, i) for i, segment in enumerate(segments.tolist())
+                for x, y, _ in rasterize_line(*segment, None, algorithm)]
+    assert list(zip(xs.tolist(), ys.tolist(), segment_id.tolist())) == expected
+
+# the lines drawn in the UI go straight into the batch rasterizer
+def test_batch_accepts_ui_lines():
+    pytest.importorskip("PySide6")
+    # ui selects the Qt backend on import, which needs an application first
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication([])
+    from ui import Line
+    lines = [Line(0, 0, 5, 2, (0, 0, 0, 255)), Line(1.4, 7.6, -3, 1, (0, 0, 0, 255))]
+    expected = rasterize_lines_batch([[0, 0, 5, 2], [1.4, 7.6, -3, 1]], RasterizingAlgorithm.Bresenham)
+    result = rasterize_lines_batch(lines, RasterizingAlgorithm.Bresenham)
+    assert all(np.array_equal(a, b) for a, b in zip(result, expected))
+
+# cold import of raster in a fresh interpreter, best of several runs, and whether it
+# pulled in NumPy
+def measure_import(module="raster", runs=5):
+    code = f"import sys, time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start, 'numpy' in sys.modules)"
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.path.dirname(geometry.__file__), os.environ.get("PYTHONPATH")])))
+    seconds = math.inf
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                env=env, capture_output=True, text=True, check=True).stdout.split()
+        seconds = min(seconds, float(output[0]))
+        numpy_loaded = output[1] == "True"
+    return seconds, numpy_loaded
+
+def test_import_is_cheap():
+    seconds, numpy_loaded = measure_import()
+    assert not numpy_loaded
+    assert seconds <= IMPORT_BUDGET
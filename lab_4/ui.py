@@ -3,13 +3,26 @@ import matplotlib.pyplot as plt
 matplotlib.use('QtAgg')
 from matplotlib.backends.backend_qt5agg import FigureCanvas
 from matplotlib.figure import Figure
-from PySide6.QtCore import Qt
-from PySide6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QPushButton, QComboBox
+from matplotlib.collections import LineCollection
+from PySide6.QtCore import Qt, QTimer, Signal, QObject, QRunnable, QThreadPool
+from PySide6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QPushButton, QComboBox, QProgressBar
+import argparse
+import math
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
+# raster imports the geometry module from the shared common directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
 from raster import *
+from scene import Scene
+from framebuffer import straight_rgba8
 from time import time
 
 class Line():
+    __slots__ = ('start_x', 'start_y', 'end_x', 'end_y', 'color')
+
     def __init__(self, start_x, start_y, end_x, end_y, color):
         self.start_x = start_x
         self.start_y = start_y
@@ -18,6 +31,9 @@ class Line():
         self.color = color
 
 class ZoomableCanvas(FigureCanvas):
+    # emitted right before a redraw after the visible range changed
+    view_changed = Signal()
+
     def __init__(self, parent=None, width=5, height=4, dpi=100):
         fig = Figure(figsize=(width, height), dpi=dpi)
         self.axes = fig.add_subplot(111)
@@ -25,6 +41,12 @@ class ZoomableCanvas(FigureCanvas):
         self.setParent(parent)
         self.mpl_connect("scroll_event", self.zoom)
 
+        # scroll ticks only restart the timer, so fast scrolling redraws once
+        self.redraw_timer = QTimer(self)
+        self.redraw_timer.setSingleShot(True)
+        self.redraw_timer.setInterval(30)
+        self.redraw_timer.timeout.connect(self.redraw)
+
         self.reset()
 
     def reset(self):
@@ -44,6 +66,10 @@ class ZoomableCanvas(FigureCanvas):
 
         self.axes.set_xlim(self.x_min, self.x_max)
         self.axes.set_ylim(self.y_min, self.y_max)
+        self.redraw_timer.start()
+
+    def redraw(self):
+        self.view_changed.emit()
         self.draw()
 
     def zoom(self, event):
@@ -58,8 +84,37 @@ class ZoomableCanvas(FigureCanvas):
         ydata = event.ydata
         self.calculate_zoom(xdata, ydata, scale_factor)
 
+class RasterJobSignals(QObject):
+    progress = Signal(int, int)
+    # the job, the updated layer or None when cancelled, and the seconds it took
+    finished = Signal(object, object, float)
+
+# brings one layer of the scene up to date on a pool thread; the signals reach the
+# window on the GUI thread
+class RasterJob(QRunnable):
+    def __init__(self, scene, algorithm, executor=None):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.scene = scene
+        self.algorithm = algorithm
+        self.executor = executor
+        self.signals = RasterJobSignals()
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        start = time()
+        layer = None
+        try:
+            layer = self.scene.layer(self.algorithm, self.signals.progress.emit, self.cancel_event.is_set, self.executor)
+        finally:
+            self.signals.finished.emit(self, layer, time() - start)
+
 class MainWindow(QMainWindow):
-    def __init__(self):
+    # with processes > 1 the lines are rasterized in a pool of that many processes
+    def __init__(self, processes=0):
         super().__init__()
         self.setWindowTitle("Coordinate Plane")
 
@@ -74,22 +129,46 @@ class MainWindow(QMainWindow):
         self.rasterize_dropdown.addItem("Digital Differential Analyzer (DDA)")
         self.rasterize_dropdown.addItem("Bresenham's Line Algorithm")
         self.rasterize_dropdown.addItem("Bresenham's Circle Algorithm")
+        self.rasterize_dropdown.addItem("Midpoint Ellipse Algorithm")
+        self.rasterize_dropdown.addItem("Xiaolin Wu's Anti-aliased Line")
         self.layout.addWidget(self.rasterize_dropdown)
 
         self.draw_button = QPushButton("Draw")
         self.clear_button = QPushButton("Clear")
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setEnabled(False)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.hide()
         self.layout.addWidget(self.draw_button)
         self.layout.addWidget(self.clear_button)
+        self.layout.addWidget(self.cancel_button)
+        self.layout.addWidget(self.progress_bar)
 
         self.setCentralWidget(self.main_widget)
 
         self.draw_button.clicked.connect(self.update_filled_pixels)
         self.clear_button.clicked.connect(self.clear_canvas)
+        self.cancel_button.clicked.connect(self.cancel_job)
+        # switching the algorithm shows its cached layer of the scene
+        self.rasterize_dropdown.currentIndexChanged.connect(self.show_layer)
+        self.canvas.view_changed.connect(self.update_view)
 
         self.line_color_counter = 0
 
+        # lines drawn since the last rasterization; the scene holds the rasterized ones
         self.lines : list[Line]= []
-        self.filled_pixels = []
+        self.scene = Scene()
+        # the last completed layer is shown; self.layer is that layer while no running
+        # job owns it, and None while the worker updates it
+        self.shown_layer = None
+        self.layer = None
+        self.reset_pixel_layer()
+
+        # rasterization runs on one pool thread, so jobs on the same layer never overlap
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+        self.executor = ProcessPoolExecutor(max_workers=processes) if processes > 1 else None
+        self.job = None
 
         self.canvas.mpl_connect("button_press_event", self.get_coordinates)
         self.canvas.mpl_connect("button_release_event", self.finish_line)
@@ -124,29 +203,155 @@ class MainWindow(QMainWindow):
         self.canvas.reset()
         self.canvas.draw()
 
+        # a running job keeps working on the old scene and its result is dropped
+        self.cancel_job()
         self.lines = []
-        self.filled_pixels = []
+        self.scene = Scene()
+        self.shown_layer = None
+        self.layer = None
+        self.reset_pixel_layer()
 
         self.line_color_counter = 0
 
-    def update_filled_pixels(self):
-        start = time()
-        algo = self.rasterize_dropdown.currentIndex()
+    # the layer shown as one image with the cell edges as a separate line collection on top
+    def reset_pixel_layer(self):
+        self.pixel_image = None
+        self.pixel_edges = None
 
-        for l in self.lines:
-            self.filled_pixels.extend(rasterize_line(l.start_x, l.start_y, l.end_x, l.end_y, l.color, algo))
+    def update_filled_pixels(self):
+        self.scene.add_lines(self.lines)
         self.lines.clear()
+        self.show_layer()
 
-        for pixel in self.filled_pixels:
-            x, y, color = pixel
-            self.canvas.axes.fill([x, x + 1, x + 1, x], [y, y, y + 1, y + 1], color=color, edgecolor='lightgray')
-        self.filled_pixels.clear()
+    # bring the layer of the selected algorithm up to date on the worker and show it
+    # when done; only lines the layer has not rasterized before are rasterized
+    def show_layer(self):
+        if not self.scene.lines:
+            return
+        self.cancel_job()
+        algorithm = self.rasterize_dropdown.currentIndex()
+
+        self.job = RasterJob(self.scene, algorithm, self.executor)
+        # the layer belongs to the worker until the job finishes
+        if self.owned_by_job(self.layer):
+            self.layer = None
+        self.job.signals.progress.connect(self.job_progress)
+        self.job.signals.finished.connect(self.job_finished)
+        self.progress_bar.setValue(0)
+        self.progress_bar.show()
+        self.cancel_button.setEnabled(True)
+        self.thread_pool.start(self.job)
+
+    def cancel_job(self):
+        if self.job is not None:
+            self.job.cancel()
+            self.job = None
+        self.progress_bar.hide()
+        self.cancel_button.setEnabled(False)
+
+    def job_progress(self, done, total):
+        self.progress_bar.setMaximum(total)
+        self.progress_bar.setValue(done)
+
+    # whether the running job may be updating the layer
+    def owned_by_job(self, layer):
+        return layer is not None and self.job is not None and layer is self.job.scene.layers.get(self.job.algorithm)
+
+    # results of cancelled or replaced jobs are dropped; once their worker has returned
+    # the last completed layer can be shown again, unless the next job owns it
+    def job_finished(self, job, layer, elapsed):
+        if job is not self.job or layer is None:
+            if job is self.job:
+                self.cancel_job()
+            if self.layer is None and self.shown_layer is not None and not self.owned_by_job(self.shown_layer):
+                self.layer = self.shown_layer
+                self.blit_pixels(self.layer)
+                self.canvas.draw_idle()
+            return
+        self.job = None
+        self.progress_bar.hide()
+        self.cancel_button.setEnabled(False)
+        self.layer = self.shown_layer = layer
 
+        # the reported time covers the rasterization on the worker and the redraw
+        start = time()
+        self.blit_pixels(self.layer)
         self.canvas.draw()
-        end = time()
-        print(F"Time elapsed {end-start}")
+        print(F"Time elapsed {elapsed + time() - start}")
+
+    def closeEvent(self, event):
+        self.cancel_job()
+        self.thread_pool.waitForDone()
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+        super().closeEvent(event)
+
+    # the visible range changed: show the part of the layer in view at its new detail level
+    def update_view(self):
+        if self.layer is not None:
+            self.blit_pixels(self.layer)
+
+    def hide_pixels(self):
+        if self.pixel_image is not None:
+            self.pixel_image.set_visible(False)
+            self.pixel_edges.set_visible(False)
+
+    # only the cells in view are submitted. When several cells fall into one screen
+    # pixel the layer is shown aggregated over 2**level x 2**level cell blocks, without
+    # cell edges
+    def blit_pixels(self, layer):
+        if layer.image is None:
+            self.hide_pixels()
+            return
+
+        canvas = self.canvas
+        cells_per_pixel = min((canvas.x_max - canvas.x_min) / max(canvas.axes.bbox.width, 1),
+                              (canvas.y_max - canvas.y_min) / max(canvas.axes.bbox.height, 1))
+        level = int(math.log2(cells_per_pixel)) if cells_per_pixel >= 2 else 0
+        scale = 2 ** level
+
+        # visible cells holding pixels, then the blocks of the level covering them
+        x_min = max(math.floor(canvas.x_min), layer.bounds[0])
+        y_min = max(math.floor(canvas.y_min), layer.bounds[1])
+        x_max = min(math.floor(canvas.x_max), layer.bounds[2])
+        y_max = min(math.floor(canvas.y_max), layer.bounds[3])
+        if x_min > x_max or y_min > y_max:
+            self.hide_pixels()
+            return
+        framebuffer = layer.framebuffer
+        col0, col1 = (x_min - framebuffer.x_min) // scale, (x_max - framebuffer.x_min) // scale
+        row0, row1 = (y_min - framebuffer.y_min) // scale, (y_max - framebuffer.y_min) // scale
+        if level == 0:
+            image = layer.image[row0:row1 + 1, col0:col1 + 1]
+            # cell edges covering the visible cells
+            xs = np.arange(x_min, x_max + 2)
+            ys = np.arange(y_min, y_max + 2)
+            edges = [[(x, y_min), (x, y_max + 1)] for x in xs]
+            edges.extend([(x_min, y), (x_max + 1, y)] for y in ys)
+        else:
+            image = straight_rgba8(layer.level(level)[row0:row1 + 1, col0:col1 + 1])
+            edges = []
+        extent = (framebuffer.x_min + col0 * scale, framebuffer.x_min + (col1 + 1) * scale,
+                  framebuffer.y_min + row0 * scale, framebuffer.y_min + (row1 + 1) * scale)
+
+        if self.pixel_image is None:
+            self.pixel_image = self.canvas.axes.imshow(image, extent=extent, origin='lower',
+                                                       interpolation='nearest', aspect='auto', zorder=2)
+            self.pixel_edges = LineCollection(edges, colors='lightgray', linewidths=0.5, zorder=3)
+            self.canvas.axes.add_collection(self.pixel_edges, autolim=False)
+        else:
+            self.pixel_image.set_data(image)
+            self.pixel_image.set_extent(extent)
+            self.pixel_edges.set_segments(edges)
+            self.pixel_image.set_visible(True)
+            self.pixel_edges.set_visible(True)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Line rasterization on a coordinate plane")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="rasterize in a pool of this many processes instead of a worker thread")
+    args = parser.parse_args()
+
     app = QApplication([])
-    window = MainWindow()
+    window = MainWindow(args.processes)
     app.exec()
@@ -0,0 +1,74 @@
+import argparse
+import json
+import math
+import os
+import sys
+from time import perf_counter
+import numpy as np
+# line_clipping imports geometry from the shared common directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'common'))
+from line_clipping import *
+
+ALGORITHMS = {name: value for name, value in vars(ClippingAlgorithm).items() if not name.startswith('_')}
+VIEWPORT = Viewport(0, 0, 100, 100)
+
+# (N, 4) segments for the workload; the viewport is [0, 100] x [0, 100]
+def make_segments(workload, count, seed=0):
+    rng = np.random.default_rng(seed)
+    if workload == "inside":
+        return rng.uniform(0, 100, (count, 4))
+    if workload == "outside":
+        # both endpoints beyond the same boundary
+        segments = rng.uniform(-100, 200, (count, 4))
+        side = rng.integers(0, 4, count)
+        axis = np.where(side < 2, 0, 1)
+        offset = np.where(side % 2 == 0, -1, 1) * rng.uniform(1, 100, (2, count))
+        edge = np.where(side % 2 == 0, 0, 100)
+        for end in (0, 1):
+            segments[np.arange(count), 2 * end + axis] = edge + offset[end]
+        return segments
+    # crossing: endpoints on opposite sides of the viewport
+    angle = rng.uniform(0, 2 * math.pi, count)
+    center = rng.uniform(20, 80, (count, 2))
+    direction = np.stack([np.cos(angle), np.sin(angle)], axis=1) * 150
+    return np.concatenate([center - direction, center + direction], axis=1)
+
+def run_scalar(segments, algorithm):
+    lines = [Line(*segment) for segment in segments.tolist()]
+    start = perf_counter()
+    accepted = sum(clip_line(line, VIEWPORT, algorithm) is not None for line in lines)
+    return perf_counter() - start, accepted
+
+def run_batch(segments, algorithm):
+    start = perf_counter()
+    _, accepted = clip_lines_batch(segments, VIEWPORT, algorithm)
+    return perf_counter() - start, int(accepted.sum())
+
+def benchmark(workloads, count, scalar_count, repeat, seed):
+    results = []
+    for workload in workloads:
+        segments = make_segments(workload, count, seed)
+        for path, run, n in (("scalar", run_scalar, min(count, scalar_count)), ("batch", run_batch, count)):
+            for name, algorithm in ALGORITHMS.items():
+                seconds, accepted = min(run(segments[:n], algorithm) for _ in range(repeat))
+                results.append({"workload": workload, "path": path, "algorithm": name, "segments": n,
+                                "accepted": accepted, "seconds": seconds, "segments_per_sec": n / seconds})
+                print(f"{workload:8} {path:6} {name:16} {n / seconds:14.0f} segments/s", file=sys.stderr)
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare Cohen-Sutherland and Liang-Barsky clipping")
+    parser.add_argument("--workloads", nargs="+", choices=["inside", "outside", "crossing"], default=["inside", "outside", "crossing"])
+    parser.add_argument("--count", type=int, default=1000000)
+    parser.add_argument("--scalar-count", type=int, default=100000, help="segments used for the scalar runs")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = json.dumps(benchmark(args.workloads, args.count, args.scalar_count, args.repeat, args.seed), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+    else:
+        print(report)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the tests import the lab modules directly, so put the shared common directory on
+# the path the way main.py and benchmark.py do
+COMMON = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'common')
+sys.path.insert(0, COMMON)
@@ -1,18 +1,21 @@
 import numpy as np
 
-# define the Line and Viewport classes
-class Line:
-    def __init__(self, x1, y1, x2, y2):
-        self.x1, self.y1 = x1, y1
-        self.x2, self.y2 = x2, y2
+# the Line and Viewport classes are shared with the other labs
+from geometry import Line, Viewport, LineArray, as_segments, segment_bounds
 
-class Viewport:
-    def __init__(self, xmin, ymin, xmax, ymax):
-        self.xmin, self.ymin = xmin, ymin
-        self.xmax, self.ymax = xmax, ymax
+# Enum for line clipping algorithms
+class ClippingAlgorithm:
+    CohenSutherland = 0
+    LiangBarsky = 1
+
+# clip a line against the viewport with the chosen algorithm, None if it is outside
+def clip_line(line : Line, viewport : Viewport, algorithm = ClippingAlgorithm.CohenSutherland) -> Line | None:
+    if algorithm == ClippingAlgorithm.LiangBarsky:
+        return liang_barsky_clip(line, viewport)
+    return cohen_sutherland_clip(line, viewport)
 
 # function to implement Cohen-Sutherland algorithm for line clipping
-def clip_line(line : Line, viewport : Viewport) -> Line | None:
+def cohen_sutherland_clip(line : Line, viewport : Viewport) -> Line | None:
     x1, y1, x2, y2 = line.x1, line.y1, line.x2, line.y2
     xmin, ymin, xmax, ymax = viewport.xmin, viewport.ymin, viewport.xmax, viewport.ymax
 
@@ -67,6 +70,34 @@ def clip_line(line : Line, viewport : Viewport) -> Line | None:
                 x2, y2 = x, y
                 code2 = compute_code(x2, y2, xmin, ymin, xmax, ymax)
 
+# function to implement Liang-Barsky algorithm for line clipping; the line is
+# x1 + t * dx, y1 + t * dy for t in [0, 1] and every boundary narrows that range
+def liang_barsky_clip(line : Line, viewport : Viewport) -> Line | None:
+    x1, y1, x2, y2 = line.x1, line.y1, line.x2, line.y2
+    dx, dy = x2 - x1, y2 - y1
+    t0, t1 = 0.0, 1.0
+
+    # p < 0: the line enters through this boundary, p > 0: it leaves through it
+    for p, q in ((-dx, x1 - viewport.xmin), (dx, viewport.xmax - x1), (-dy, y1 - viewport.ymin), (dy, viewport.ymax - y1)):
+        if p == 0:
+            # parallel to the boundary and outside of it
+            if q < 0:
+                return None
+            continue
+        t = q / p
+        if p < 0:
+            t0 = max(t0, t)
+        else:
+            t1 = min(t1, t)
+        if t0 > t1:
+            return None
+
+    if t1 < 1:
+        x2, y2 = x1 + t1 * dx, y1 + t1 * dy
+    if t0 > 0:
+        x1, y1 = x1 + t0 * dx, y1 + t0 * dy
+    return Line(x1, y1, x2, y2)
+
 # function to compute the binary code for a point
 def compute_code(x, y, xmin, ymin, xmax, ymax):
     x_code = 0
@@ -78,9 +109,92 @@ def compute_code(x, y, xmin, ymin, xmax, ymax):
     else:
         x_code = 0b0000
     if y < ymin:
-        y_code = 0b1000
-    elif y > ymax:
         y_code = 0b0100
+    elif y > ymax:
+        y_code = 0b1000
     else:
         y_code = 0b0000
-    return x_code | y_code
\ No newline at end of file
+    return x_code | y_code
+
+# vectorized compute_code for arrays of points
+def compute_codes(x, y, xmin, ymin, xmax, ymax):
+    codes = np.where(x < xmin, 0b0001, np.where(x > xmax, 0b0010, 0b0000))
+    codes |= np.where(y < ymin, 0b0100, np.where(y > ymax, 0b1000, 0b0000))
+    return codes
+
+# clip an (N, 4) array of x1, y1, x2, y2 rows, a LineArray or a list of Lines with the
+# chosen algorithm. Returns the clipped segments (rejected rows are NaN) and a mask of the accepted ones
+def clip_lines_batch(segments, viewport : Viewport, algorithm = ClippingAlgorithm.CohenSutherland):
+    if algorithm == ClippingAlgorithm.LiangBarsky:
+        return liang_barsky_clip_batch(segments, viewport)
+    return cohen_sutherland_clip_batch(segments, viewport)
+
+# vectorized Cohen-Sutherland
+def cohen_sutherland_clip_batch(segments, viewport : Viewport):
+    segments = np.array(as_segments(segments))
+    x1, y1, x2, y2 = segments.T
+    xmin, ymin, xmax, ymax = viewport.xmin, viewport.ymin, viewport.xmax, viewport.ymax
+
+    code1 = compute_codes(x1, y1, xmin, ymin, xmax, ymax)
+    code2 = compute_codes(x2, y2, xmin, ymin, xmax, ymax)
+    accepted = np.zeros(len(segments), dtype=bool)
+    rejected = np.zeros(len(segments), dtype=bool)
+
+    # each pass settles the trivially accepted and rejected segments and moves one
+    # endpoint of every other segment onto a viewport boundary
+    remaining = np.arange(len(segments))
+    while len(remaining):
+        c1, c2 = code1[remaining], code2[remaining]
+        inside = (c1 | c2) == 0
+        outside = (c1 & c2) != 0
+        accepted[remaining[inside]] = True
+        rejected[remaining[outside]] = True
+        remaining = remaining[~inside & ~outside]
+        if not len(remaining):
+            break
+
+        c1, c2 = code1[remaining], code2[remaining]
+        sx1, sy1, sx2, sy2 = x1[remaining], y1[remaining], x2[remaining], y2[remaining]
+        first = c1 != 0
+        code = np.where(first, c1, c2)
+
+        # the same boundary priority as clip_line: top, bottom, right, left
+        top = (code & 0b1000) != 0
+        bottom = ~top & ((code & 0b0100) != 0)
+        right = ~top & ~bottom & ((code & 0b0010) != 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            y_edge = np.where(top, ymax, ymin)
+            x_edge = np.where(right, xmax, xmin)
+            horizontal = top | bottom
+            x = np.where(horizontal, sx1 + (y_edge - sy1) * (sx2 - sx1) / (sy2 - sy1), x_edge)
+            y = np.where(horizontal, y_edge, sy1 + (x_edge - sx1) * (sy2 - sy1) / (sx2 - sx1))
+
+        moved = remaining[first]
+        x1[moved], y1[moved] = x[first], y[first]
+        code1[moved] = compute_codes(x1[moved], y1[moved], xmin, ymin, xmax, ymax)
+        moved = remaining[~first]
+        x2[moved], y2[moved] = x[~first], y[~first]
+        code2[moved] = compute_codes(x2[moved], y2[moved], xmin, ymin, xmax, ymax)
+
+    segments[rejected] = np.nan
+    return segments, accepted
+
+# vectorized Liang-Barsky, every segment is settled in a single pass
+def liang_barsky_clip_batch(segments, viewport : Viewport):
+    segments = as_segments(segments)
+    x1, y1, x2, y2 = segments.T
+    dx, dy = x2 - x1, y2 - y1
+
+    p = np.stack([-dx, dx, -dy, dy], axis=1)
+    q = np.stack([x1 - viewport.xmin, viewport.xmax - x1, y1 - viewport.ymin, viewport.ymax - y1], axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = q / p
+    t0 = np.max(np.where(p < 0, t, 0.0), axis=1, initial=0.0)
+    t1 = np.min(np.where(p > 0, t, 1.0), axis=1, initial=1.0)
+    accepted = ~np.any((p == 0) & (q < 0), axis=1) & (t0 <= t1)
+
+    # keep the original endpoints where the range was not narrowed
+    clipped = np.stack([np.where(t0 > 0, x1 + t0 * dx, x1), np.where(t0 > 0, y1 + t0 * dy, y1),
+                        np.where(t1 < 1, x1 + t1 * dx, x2), np.where(t1 < 1, y1 + t1 * dy, y2)], axis=1)
+    clipped[~accepted] = np.nan
+    return clipped, accepted
@@ -0,0 +1,106 @@
+import itertools
+import os
+import queue
+import threading
+import numpy as np
+from line_clipping import *
+from segment_file import is_segment_file, load_segment_file, parse_segment_rows
+
+# Line files hold the segment count, one "x1 y1 x2 y2" row per segment and a
+# trailing "xmin ymin xmax ymax" viewport row.
+
+# read the viewport row by seeking back from the end of the file, so it is known
+# before any segment is parsed
+def read_viewport(filename) -> Viewport:
+    with open(filename, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        block = 256
+        while True:
+            start = max(0, size - block)
+            f.seek(start)
+            tail = f.read(size - start).rstrip()
+            # the last row is complete once a newline precedes it or the whole file was read
+            if b'\n' in tail or start == 0:
+                break
+            block *= 2
+    xmin, ymin, xmax, ymax = [float(x) for x in tail.rsplit(b'\n', 1)[-1].split()]
+    return Viewport(xmin, ymin, xmax, ymax)
+
+# parse the segment rows in chunks of at most chunk_size rows, as (K, 4) arrays
+def iter_segment_chunks(filename, chunk_size=65536):
+    with open(filename, 'r') as f:
+        remaining = int(f.readline())
+        while remaining:
+            rows = list(itertools.islice(f, min(chunk_size, remaining)))
+            if not rows:
+                raise ValueError(f"{filename}: expected {remaining} more segment rows")
+            remaining -= len(rows)
+            yield parse_segment_rows(rows, filename)
+
+# run an iterator in a background thread, keeping up to depth items ready; lets the
+# next chunk be read while the current one is clipped. When the consumer stops early
+# the producer notices within a timeout, stops pulling items and closes the iterator,
+# so a file it reads is closed too
+def prefetch(iterable, depth=2, timeout=0.1):
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    # False once the consumer has gone away
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=timeout)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except Exception as error:
+            put(error)
+            return
+        finally:
+            close = getattr(iterable, 'close', None)
+            if close is not None:
+                close()
+        put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        # drop the items read ahead so a blocked put returns at once
+        while True:
+            try:
+                items.get_nowait()
+            except queue.Empty:
+                break
+
+# parse, clip and emit a line file chunk by chunk; yields (segments, clipped, accepted)
+# per chunk so memory stays bounded by the chunk size. Binary segment files are
+# memory mapped and their chunks are paged in as they are clipped
+def clip_file(filename, chunk_size=65536, algorithm = ClippingAlgorithm.CohenSutherland):
+    if is_segment_file(filename):
+        records, bounds = load_segment_file(filename)
+        viewport = Viewport(*bounds)
+        chunks = (records[start:start + chunk_size] for start in range(0, len(records), chunk_size))
+    else:
+        viewport = read_viewport(filename)
+        chunks = prefetch(iter_segment_chunks(filename, chunk_size))
+
+    for segments in chunks:
+        clipped, accepted = clip_lines_batch(segments, viewport, algorithm)
+        yield segments, clipped, accepted
@@ -1,3 +1,4 @@
+import os
 import sys
 from PySide6.QtWidgets import QApplication, QMainWindow, QFileDialog, QPushButton, QToolBar
 import matplotlib
@@ -5,24 +6,49 @@ matplotlib.use('QtAgg')
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 from matplotlib.patches import Rectangle
+from matplotlib.widgets import RectangleSelector
+from matplotlib.collections import LineCollection
 import numpy as np
-import random as rand
+# geometry and segment_file live in the common directory shared with lab 4
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'common'))
 from line_clipping import *
+from spatial_index import SegmentIndex
+from line_file import iter_segment_chunks, read_viewport
+from segment_file import is_segment_file, load_segment_file
 
-# function to perform the line clipping and render the results on the matplotlib figure
-def clip_and_render(lines, viewport, ax):
-    for line in lines:
-        # clip the line
-        clipped_line = clip_line(line, viewport)
-        ax.plot([line.x1, line.x2], [line.y1, line.y2], color='gray')
+# function to perform the line clipping and render the results on the matplotlib figure.
+# The original and the clipped lines are drawn as one LineCollection each, the clipped
+# ones colored per line from `colors` (random when not given); passing the artists
+# returned by an earlier call only replaces the clipped lines and the viewport
+# rectangle, the original lines stay as they are. With an index only the lines whose
+# bounding boxes overlap the viewport are clipped
+def clip_and_render(lines, viewport, ax, index : SegmentIndex = None, colors = None, artists = None):
+    segments = as_segments(lines)
+    candidates = index.query(viewport) if index is not None else np.arange(len(segments))
+    clipped, accepted = clip_lines_batch(segments[candidates], viewport)
+    ids = candidates[accepted]
 
-        if clipped_line:
-            # generate a random color for the line
-            color = (rand.uniform(0, 0.8), rand.uniform(0, 0.8), rand.uniform(0, 0.8))
-            ax.plot([clipped_line.x1, clipped_line.x2], [clipped_line.y1, clipped_line.y2], color=color)
+    if colors is None:
+        # generate a random color for every clipped line
+        clipped_colors = np.random.uniform(0, 0.8, (len(ids), 3))
+    else:
+        clipped_colors = np.asarray(colors)[ids]
 
-    # render the viewport rectangle
-    ax.add_patch(Rectangle((viewport.xmin, viewport.ymin), viewport.xmax - viewport.xmin, viewport.ymax - viewport.ymin, fill=None, linewidth=3, color='r'))
+    if artists is None:
+        original_lines = LineCollection(segments.reshape(-1, 2, 2), colors='gray')
+        clipped_lines = LineCollection(clipped[accepted].reshape(-1, 2, 2), colors=clipped_colors)
+        # render the viewport rectangle
+        rectangle = Rectangle((viewport.xmin, viewport.ymin), viewport.xmax - viewport.xmin, viewport.ymax - viewport.ymin, fill=None, linewidth=3, color='r')
+        ax.add_collection(original_lines, autolim=False)
+        ax.add_collection(clipped_lines, autolim=False)
+        ax.add_patch(rectangle)
+        return original_lines, clipped_lines, rectangle
+
+    original_lines, clipped_lines, rectangle = artists
+    clipped_lines.set_segments(clipped[accepted].reshape(-1, 2, 2))
+    clipped_lines.set_color(clipped_colors)
+    rectangle.set_bounds(viewport.xmin, viewport.ymin, viewport.xmax - viewport.xmin, viewport.ymax - viewport.ymin)
+    return artists
 
 class CustomCanvas(FigureCanvas):
     def __init__(self, parent=None, width=5, height=4, dpi=100):
@@ -31,17 +57,14 @@ class CustomCanvas(FigureCanvas):
         super().__init__(fig)
         self.setParent(parent)
 
-        self.rescale([], Viewport(0,0,10,10))
-
-    def rescale(self, lines : list[Line], viewport : Viewport):
-        if lines:
-            lines_x = [line.x1 for line in lines]
-            lines_x.extend([line.x2 for line in lines])
-            lines_y = [line.y1 for line in lines]
-            lines_y.extend([line.y2 for line in lines])
+        self.rescale(Viewport(0,0,10,10))
 
-            self.x_min, self.x_max = min(viewport.xmin, min(lines_x)), max(viewport.xmax, max(lines_x))
-            self.y_min, self.y_max = min(viewport.ymin, min(lines_y)), max(viewport.ymax, max(lines_y))
+    # bounds are the (xmin, ymin, xmax, ymax) of the loaded segments as computed once by
+    # segment_bounds, None when nothing is loaded
+    def rescale(self, viewport : Viewport, bounds = None):
+        if bounds is not None:
+            self.x_min, self.x_max = min(viewport.xmin, bounds[0]), max(viewport.xmax, bounds[2])
+            self.y_min, self.y_max = min(viewport.ymin, bounds[1]), max(viewport.ymax, bounds[3])
         else:
             self.x_min, self.x_max = viewport.xmin, viewport.xmax
             self.y_min, self.y_max = viewport.ymin, viewport.ymax
@@ -64,36 +87,84 @@ class MainWindow(QMainWindow):
         self.button = QPushButton('Open File')
         self.button.clicked.connect(self.open_file)
 
-        # create the toolbar and add the button to it
+        # the viewport button lets a rectangle dragged on the plot become the viewport
+        self.viewport_button = QPushButton('Set Viewport')
+        self.viewport_button.setEnabled(False)
+        self.viewport_button.clicked.connect(self.select_viewport)
+        self.selector = None
+
+        # create the toolbar and add the buttons to it
         toolbar = QToolBar()
         toolbar.addWidget(self.button)
+        toolbar.addWidget(self.viewport_button)
 
         # add the figure canvas and toolbar to the main window
         self.addToolBar(toolbar)
         self.setCentralWidget(self.canvas)
         
-    # function to read the file and return a list of lines and a viewport object
+    # function to read the file and return its (N, 4) segments and a viewport object
     def read_file(self, filename):
-        with open(filename, 'r') as f:
-            n = int(f.readline())
-            lines = []
-            for i in range(n):
-                x1, y1, x2, y2 = [float(x) for x in f.readline().split()]
-                lines.append(Line(x1, y1, x2, y2))
-            xmin, ymin, xmax, ymax = [float(x) for x in f.readline().split()]
-            viewport = Viewport(xmin, ymin, xmax, ymax)
-        return lines, viewport
+        # binary segment files are memory mapped instead of parsed and their (N, 4)
+        # record array is used as the lines
+        if is_segment_file(filename):
+            segments, (xmin, ymin, xmax, ymax) = load_segment_file(filename)
+            return segments, Viewport(xmin, ymin, xmax, ymax)
+
+        # text files are parsed into one (N, 4) array, chunk by chunk
+        chunks = list(iter_segment_chunks(filename))
+        segments = np.concatenate(chunks) if chunks else np.empty((0, 4), dtype=np.float64)
+        viewport = read_viewport(filename)
+        return segments, viewport
 
     # function to open the file dialog and read the selected file
     def open_file(self):
-        filename, _ = QFileDialog.getOpenFileName(self, 'Open File', '.', 'Line Files (*.line)')
+        filename, _ = QFileDialog.getOpenFileName(self, 'Open File', '.', 'Line Files (*.line);;Segment Files (*.seg)')
         if filename:
             lines, viewport = self.read_file(filename)
-            
+            # the segment array and the index are built once per loaded file and reused
+            # for every viewport query
+            self.segments = as_segments(lines)
+            self.index = SegmentIndex(self.segments)
+            # every line keeps its color when the viewport changes
+            self.colors = np.random.uniform(0, 0.8, (len(self.segments), 3))
+            # the bounds are computed once per loaded file and reused on every view reset
+            self.bounds = segment_bounds(self.segments)
+
+            self.stop_selecting()
             self.canvas.axes.clear()
-            self.canvas.rescale(lines, viewport)
-            clip_and_render(lines, viewport, self.canvas.axes)
+            self.canvas.rescale(viewport, self.bounds)
+            self.artists = clip_and_render(self.segments, viewport, self.canvas.axes, self.index, self.colors)
             self.canvas.draw()
+            self.viewport_button.setEnabled(True)
+
+    # clip the loaded lines against another viewport, reusing the rendered collections
+    def set_viewport(self, viewport : Viewport):
+        self.canvas.rescale(viewport, self.bounds)
+        self.artists = clip_and_render(self.segments, viewport, self.canvas.axes, self.index, self.colors, self.artists)
+        self.canvas.draw_idle()
+
+    # wait for one rectangle to be dragged on the plot
+    def select_viewport(self):
+        if self.selector is not None:
+            return
+        self.selector = RectangleSelector(self.canvas.axes, self.viewport_selected, button=[1], props=dict(fill=False, edgecolor='r', linestyle='--'))
+
+    def stop_selecting(self):
+        if self.selector is not None:
+            self.selector.disconnect_events()
+            for artist in self.selector.artists:
+                artist.remove()
+            self.selector = None
+
+    def viewport_selected(self, press, release):
+        self.stop_selecting()
+        xmin, xmax = sorted((press.xdata, release.xdata))
+        ymin, ymax = sorted((press.ydata, release.ydata))
+        # a click without dragging keeps the viewport
+        if xmin < xmax and ymin < ymax:
+            self.set_viewport(Viewport(xmin, ymin, xmax, ymax))
+        else:
+            self.canvas.draw_idle()
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
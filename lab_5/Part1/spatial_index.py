@@ -0,0 +1,66 @@
+import math
+import numpy as np
+from line_clipping import Viewport, as_segments
+from geometry import segment_boxes
+
+# Sort-Tile-Recursive order for boxes given as (N, 4) xmin, ymin, xmax, ymax rows:
+# vertical slices by x center, then y center inside every slice
+def str_order(boxes, capacity):
+    count = len(boxes)
+    slices = math.ceil(math.sqrt(math.ceil(count / capacity)))
+    center_x = boxes[:, 0] + boxes[:, 2]
+    center_y = boxes[:, 1] + boxes[:, 3]
+
+    by_x = np.argsort(center_x, kind="stable")
+    slice_id = np.arange(count) // (slices * capacity)
+    return by_x[np.lexsort((center_y[by_x], slice_id))]
+
+# bounding boxes of consecutive groups of `capacity` boxes
+def group_boxes(boxes, capacity):
+    starts = np.arange(0, len(boxes), capacity)
+    return np.stack([np.minimum.reduceat(boxes[:, 0], starts), np.minimum.reduceat(boxes[:, 1], starts),
+                     np.maximum.reduceat(boxes[:, 2], starts), np.maximum.reduceat(boxes[:, 3], starts)], axis=1)
+
+# STR bulk-loaded R-tree over segment bounding boxes; built once per dataset and
+# queried with a viewport to get the segments whose boxes overlap it
+class SegmentIndex:
+    def __init__(self, segments, capacity=16):
+        segments = as_segments(segments)
+        self.capacity = capacity
+
+        boxes = segment_boxes(segments)
+        order = str_order(boxes, capacity) if len(boxes) else np.arange(0)
+        self.ids = order
+        # levels[0] are the leaf boxes, every level above holds one box per group of
+        # `capacity` consecutive boxes of the level below
+        self.levels = [boxes[order]]
+        # first child of every node, per level above the leaves
+        self.child_start = []
+        while len(self.levels[-1]) > capacity:
+            below = self.levels[-1]
+            parents = group_boxes(below, capacity)
+            starts = np.arange(0, len(below), capacity)
+            order = str_order(parents, capacity)
+            self.levels.append(parents[order])
+            self.child_start.append(starts[order])
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ids of the segments whose bounding boxes overlap the viewport
+    def query(self, viewport : Viewport):
+        candidates = np.arange(len(self.levels[-1]))
+        for level in range(len(self.levels) - 1, -1, -1):
+            boxes = self.levels[level][candidates]
+            overlap = ((boxes[:, 0] <= viewport.xmax) & (boxes[:, 2] >= viewport.xmin) &
+                       (boxes[:, 1] <= viewport.ymax) & (boxes[:, 3] >= viewport.ymin))
+            candidates = candidates[overlap]
+            if level == 0:
+                break
+
+            # expand the surviving nodes to their children in the level below
+            start = self.child_start[level - 1][candidates]
+            count = np.minimum(start + self.capacity, len(self.levels[level - 1])) - start
+            offsets = np.repeat(start - np.cumsum(count) + count, count)
+            candidates = offsets + np.arange(int(count.sum()))
+        return np.sort(self.ids[candidates])
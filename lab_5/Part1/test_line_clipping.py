@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from line_clipping import *
+
+VIEWPORT = Viewport(-20.0, -10.0, 30.0, 25.0)
+
+# random segments around the viewport with vertical, horizontal, zero length and
+# boundary touching ones mixed in
+def random_segments(count=4000, seed=0):
+    rng = np.random.default_rng(seed)
+    segments = rng.uniform(-60, 60, (count, 4))
+    segments[1::6, 2] = segments[1::6, 0]
+    segments[2::6, 3] = segments[2::6, 1]
+    segments[3::6, 2:] = segments[3::6, :2]
+    segments[4::12, 0] = VIEWPORT.xmax
+    segments[5::12, 1] = VIEWPORT.ymin
+    return segments
+
+def scalar_clip(segments, algorithm):
+    lines = [clip_line(Line(*segment), VIEWPORT, algorithm) for segment in segments.tolist()]
+    accepted = np.array([line is not None for line in lines])
+    clipped = np.array([(line.x1, line.y1, line.x2, line.y2) if line else (np.nan,) * 4 for line in lines])
+    return clipped, accepted
+
+@pytest.mark.parametrize("algorithm", [ClippingAlgorithm.CohenSutherland, ClippingAlgorithm.LiangBarsky])
+def test_batch_matches_clip_line(algorithm):
+    segments = random_segments()
+    clipped, accepted = clip_lines_batch(segments, VIEWPORT, algorithm)
+    expected, expected_accepted = scalar_clip(segments, algorithm)
+    assert np.array_equal(accepted, expected_accepted)
+    assert np.array_equal(clipped, expected, equal_nan=True)
+
+# both algorithms keep the same part of every segment that crosses the viewport
+def test_liang_barsky_agrees_with_cohen_sutherland():
+    segments = random_segments()
+    cs, cs_accepted = clip_lines_batch(segments, VIEWPORT, ClippingAlgorithm.CohenSutherland)
+    lb, lb_accepted = clip_lines_batch(segments, VIEWPORT, ClippingAlgorithm.LiangBarsky)
+    assert np.array_equal(cs_accepted, lb_accepted)
+    assert np.allclose(cs[cs_accepted], lb[lb_accepted], rtol=0, atol=1e-9)
+
+# below ymin is bottom (0b0100), above ymax is top (0b1000)
+def test_outcodes():
+    v = VIEWPORT
+    assert compute_code(0, v.ymin - 1, v.xmin, v.ymin, v.xmax, v.ymax) == 0b0100
+    assert compute_code(0, v.ymax + 1, v.xmin, v.ymin, v.xmax, v.ymax) == 0b1000
+    assert compute_code(v.xmin - 1, 0, v.xmin, v.ymin, v.xmax, v.ymax) == 0b0001
+    assert compute_code(v.xmax + 1, v.ymax + 1, v.xmin, v.ymin, v.xmax, v.ymax) == 0b1010
+    x = np.array([0, 0, v.xmin - 1, v.xmax + 1])
+    y = np.array([v.ymin - 1, v.ymax + 1, 0, v.ymax + 1])
+    assert compute_codes(x, y, v.xmin, v.ymin, v.xmax, v.ymax).tolist() == [0b0100, 0b1000, 0b0001, 0b1010]
+
+# a vertical line through the whole viewport is cut at ymin and ymax, not swapped
+@pytest.mark.parametrize("algorithm", [ClippingAlgorithm.CohenSutherland, ClippingAlgorithm.LiangBarsky])
+def test_vertical_line_clipped_to_ymin_and_ymax(algorithm):
+    line = clip_line(Line(5.0, -40.0, 5.0, 70.0), VIEWPORT, algorithm)
+    assert (line.x1, line.y1, line.x2, line.y2) == pytest.approx((5.0, -10.0, 5.0, 25.0))
+    clipped, accepted = clip_lines_batch([[5.0, 70.0, 5.0, -40.0]], VIEWPORT, algorithm)
+    assert accepted.tolist() == [True]
+    assert clipped[0].tolist() == pytest.approx([5.0, 25.0, 5.0, -10.0])
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+from line_file import *
+from segment_file import convert_text_file, load_segment_file
+
+def write_lines(path, rows, viewport="0 0 10 10"):
+    path.write_text(f"{len(rows)}\n" + "".join(row + "\n" for row in rows) + viewport + "\n")
+    return str(path)
+
+def test_chunks_and_conversion_match(tmp_path):
+    rows = [f"{i} {i + 0.5} {-i} {2 * i}" for i in range(10)]
+    filename = write_lines(tmp_path / "a.line", rows)
+    expected = np.array([[float(v) for v in row.split()] for row in rows])
+    assert np.array_equal(np.concatenate(list(iter_segment_chunks(filename, chunk_size=3))), expected)
+    convert_text_file(filename, str(tmp_path / "a.seg"))
+    segments, viewport = load_segment_file(str(tmp_path / "a.seg"))
+    assert np.array_equal(segments, expected) and viewport == (0, 0, 10, 10)
+
+# rows with a value moved to the next row still hold 4 * K values in total
+@pytest.mark.parametrize("rows", [["1 2 3", "4 5 6 7 8"], ["1 2 3 4", "5 6 7", "8 9 10 11 12"], ["1 2 3 4", ""]])
+def test_malformed_rows_raise(tmp_path, rows):
+    filename = write_lines(tmp_path / "bad.line", rows)
+    with pytest.raises(ValueError):
+        list(iter_segment_chunks(filename))
+    with pytest.raises(ValueError):
+        convert_text_file(filename, str(tmp_path / "bad.seg"))
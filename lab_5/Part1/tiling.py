@@ -0,0 +1,101 @@
+import math
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from line_clipping import *
+from geometry import segment_boxes, expand_cell_ranges
+
+# viewports as a (T, 4) array of xmin, ymin, xmax, ymax rows
+def viewport_array(viewports):
+    if isinstance(viewports, np.ndarray):
+        return viewports.astype(np.float64).reshape(-1, 4)
+    return np.array([[v.xmin, v.ymin, v.xmax, v.ymax] for v in viewports], dtype=np.float64).reshape(-1, 4)
+
+# uniform grid over the union of the tiles; every cell lists the tiles overlapping it
+class TileGrid:
+    def __init__(self, tiles):
+        self.tiles = tiles
+        self.xmin, self.ymin = tiles[:, 0].min(), tiles[:, 1].min()
+        self.xmax, self.ymax = tiles[:, 2].max(), tiles[:, 3].max()
+        self.columns = self.rows = max(1, math.ceil(math.sqrt(len(tiles))))
+        self.cell_width = (self.xmax - self.xmin) / self.columns or 1.0
+        self.cell_height = (self.ymax - self.ymin) / self.rows or 1.0
+
+        cx0, cy0, cx1, cy1 = self.cell_ranges(tiles)
+        tile_id, cell = self._expand(np.arange(len(tiles)), cx0, cy0, cx1, cy1)
+        order = np.argsort(cell, kind="stable")
+        self.cell_tiles = tile_id[order]
+        self.cell_start = np.searchsorted(cell[order], np.arange(self.columns * self.rows + 1))
+
+    # inclusive range of cells covered by (N, 4) boxes, clamped to the grid
+    def cell_ranges(self, boxes):
+        cx0 = np.clip(((boxes[:, 0] - self.xmin) // self.cell_width).astype(np.int64), 0, self.columns - 1)
+        cy0 = np.clip(((boxes[:, 1] - self.ymin) // self.cell_height).astype(np.int64), 0, self.rows - 1)
+        cx1 = np.clip(((boxes[:, 2] - self.xmin) // self.cell_width).astype(np.int64), 0, self.columns - 1)
+        cy1 = np.clip(((boxes[:, 3] - self.ymin) // self.cell_height).astype(np.int64), 0, self.rows - 1)
+        return cx0, cy0, cx1, cy1
+
+    # one (id, cell) pair for every cell in every range
+    def _expand(self, ids, cx0, cy0, cx1, cy1):
+        owner, cell = expand_cell_ranges(cx0, cy0, cx1, cy1, self.columns)
+        return ids[owner], cell
+
+    # (segment, tile) pairs whose bounding boxes overlap, each pair once
+    def candidate_pairs(self, boxes):
+        near = ((boxes[:, 0] <= self.xmax) & (boxes[:, 2] >= self.xmin) &
+                (boxes[:, 1] <= self.ymax) & (boxes[:, 3] >= self.ymin))
+        ids = np.nonzero(near)[0]
+        segment, cell = self._expand(ids, *self.cell_ranges(boxes[ids]))
+
+        count = self.cell_start[cell + 1] - self.cell_start[cell]
+        segment = np.repeat(segment, count)
+        step = np.arange(int(count.sum())) - np.repeat(np.cumsum(count) - count, count)
+        tile = self.cell_tiles[np.repeat(self.cell_start[cell], count) + step]
+
+        box, bounds = boxes[segment], self.tiles[tile]
+        overlap = ((box[:, 0] <= bounds[:, 2]) & (box[:, 2] >= bounds[:, 0]) &
+                   (box[:, 1] <= bounds[:, 3]) & (box[:, 3] >= bounds[:, 1]))
+        key = np.unique(tile[overlap] * len(boxes) + segment[overlap])
+        return key % len(boxes), key // len(boxes)
+
+# clip the candidate segments of every tile; pairs are sorted by tile
+def _clip_tiles(segments, segment_ids, tile_ids, tiles, algorithm):
+    results = []
+    bounds = np.searchsorted(tile_ids, np.arange(len(tiles) + 1))
+    for tile, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+        ids = segment_ids[start:end]
+        clipped, accepted = clip_lines_batch(segments[ids], Viewport(*tiles[tile]), algorithm)
+        results.append((ids[accepted], clipped[accepted]))
+    return results
+
+def _clip_tile_batch(args):
+    return _clip_tiles(*args)
+
+# clip one set of segments against many viewports. The segment bounding boxes are
+# computed once and a grid over the tiles limits every segment to the tiles it can
+# touch. Returns one (segment_ids, clipped (K, 4) array) pair per viewport, in order
+def clip_lines_tiles(segments, viewports, algorithm = ClippingAlgorithm.CohenSutherland, workers = 1, tiles_per_batch = 64):
+    segments = as_segments(segments)
+    tiles = viewport_array(viewports)
+    if not len(tiles):
+        return []
+
+    boxes = segment_boxes(segments)
+    segment_ids, tile_ids = TileGrid(tiles).candidate_pairs(boxes)
+
+    if workers <= 1:
+        return _clip_tiles(segments, segment_ids, tile_ids, tiles, algorithm)
+
+    # every batch gets its tiles and only the segments they can touch
+    batches = []
+    bounds = np.searchsorted(tile_ids, np.arange(0, len(tiles) + tiles_per_batch, tiles_per_batch).clip(max=len(tiles)))
+    for first, (start, end) in zip(range(0, len(tiles), tiles_per_batch), zip(bounds[:-1], bounds[1:])):
+        used, local_ids = np.unique(segment_ids[start:end], return_inverse=True)
+        batch_tiles = tiles[first:first + tiles_per_batch]
+        batches.append((segments[used], local_ids, tile_ids[start:end] - first, batch_tiles, algorithm, used))
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch, batch_results in zip(batches, executor.map(_clip_tile_batch, [batch[:5] for batch in batches])):
+            used = batch[5]
+            results.extend((used[ids], clipped) for ids, clipped in batch_results)
+    return results
@@ -0,0 +1,194 @@
+from __future__ import annotations
+import math
+import numpy as np
+from polygon_clip import *
+from geometry import segment_boxes, expand_cell_ranges
+
+# Greiner-Hormann clipping of a subject polygon by an arbitrary clip polygon. Both are
+# (N, 2) vertex rings and may be concave or self intersecting (even-odd rule); the
+# intersection comes back as one ring per separate piece instead of a single ring
+# joined by edges running along the clip border.
+
+# tolerance on the edge parameters below which a hit counts as touching a vertex
+TOLERANCE = 1e-9
+# size of the vertex perturbation relative to the extent of the input
+PERTURBATION = 1e-6
+MAX_PERTURBATIONS = 16
+
+# viewport as a counter clockwise clip ring
+def viewport_ring(v : Viewport):
+    return np.array([[v.xmin, v.ymin], [v.xmax, v.ymin], [v.xmax, v.ymax], [v.xmin, v.ymax]], dtype=np.float64)
+
+# ring without repeated consecutive vertices, so no edge has zero length
+def _clean_ring(vertices):
+    ring = np.asarray(vertices, dtype=np.float64).reshape(-1, 2)
+    keep = np.any(ring != np.roll(ring, -1, axis=0), axis=1)
+    return ring[keep] if len(ring) > 1 else ring
+
+# (N, 4) x1, y1, x2, y2 edges of a closed ring
+def _ring_edges(ring):
+    return np.concatenate([ring, np.roll(ring, -1, axis=0)], axis=1)
+
+# even-odd point in polygon test
+def point_in_polygon(x, y, ring) -> bool:
+    x1, y1 = ring[:, 0], ring[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    crosses = (y1 > y) != (y2 > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+    return bool(np.count_nonzero(crosses & (x < x_cross)) % 2)
+
+# (a, b) pairs of edges whose bounding boxes overlap. Both edge sets are hashed into a
+# uniform grid of about one cell per edge, but no smaller than a typical edge box, and
+# only edges sharing a cell are paired, so the work grows with the number of edges and
+# close pairs instead of n * m
+def candidate_pairs(a_edges, b_edges):
+    a_boxes, b_boxes = segment_boxes(a_edges), segment_boxes(b_edges)
+    low = np.minimum(a_boxes[:, :2].min(axis=0), b_boxes[:, :2].min(axis=0))
+    high = np.maximum(a_boxes[:, 2:].max(axis=0), b_boxes[:, 2:].max(axis=0))
+    boxes = np.concatenate([a_boxes, b_boxes])
+    typical = float(np.median(np.maximum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])))
+    size = max(float((high - low).max()) / math.sqrt(len(boxes)), typical) or 1.0
+    columns = int((high[0] - low[0]) // size) + 1
+
+    # one (edge, cell) pair for every cell an edge box covers
+    def cells(boxes):
+        first = ((boxes[:, :2] - low) // size).astype(np.int64)
+        last = ((boxes[:, 2:] - low) // size).astype(np.int64)
+        return expand_cell_ranges(first[:, 0], first[:, 1], last[:, 0], last[:, 1], columns)
+
+    a_ids, a_cells = cells(a_boxes)
+    b_ids, b_cells = cells(b_boxes)
+    order = np.argsort(b_cells, kind="stable")
+    b_ids, b_cells = b_ids[order], b_cells[order]
+
+    start = np.searchsorted(b_cells, a_cells, 'left')
+    count = np.searchsorted(b_cells, a_cells, 'right') - start
+    a = np.repeat(a_ids, count)
+    b = b_ids[np.repeat(start, count) + np.arange(int(count.sum())) - np.repeat(np.cumsum(count) - count, count)]
+    key = np.unique(a * len(b_boxes) + b)
+    a, b = key // len(b_boxes), key % len(b_boxes)
+
+    box, other = a_boxes[a], b_boxes[b]
+    overlap = ((box[:, 0] <= other[:, 2]) & (box[:, 2] >= other[:, 0]) &
+               (box[:, 1] <= other[:, 3]) & (box[:, 3] >= other[:, 1]))
+    return a[overlap], b[overlap]
+
+# proper crossings between the subject and clip edges as (subject edge, clip edge,
+# t along the subject edge, u along the clip edge), plus the subject vertices that
+# touch the clip boundary (a hit at an edge end or a collinear overlap)
+def _intersections(subject, clip):
+    s_edges, c_edges = _ring_edges(subject), _ring_edges(clip)
+    a, b = candidate_pairs(s_edges, c_edges)
+
+    p, r = s_edges[a, :2], s_edges[a, 2:] - s_edges[a, :2]
+    q, s = c_edges[b, :2], c_edges[b, 2:] - c_edges[b, :2]
+    qp = q - p
+    denom = r[:, 0] * s[:, 1] - r[:, 1] * s[:, 0]
+    t_num = qp[:, 0] * s[:, 1] - qp[:, 1] * s[:, 0]
+    u_num = qp[:, 0] * r[:, 1] - qp[:, 1] * r[:, 0]
+    r_length, s_length = np.hypot(r[:, 0], r[:, 1]), np.hypot(s[:, 0], s[:, 1])
+
+    parallel = np.abs(denom) <= TOLERANCE * r_length * s_length
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(parallel, np.nan, t_num / denom)
+        u = np.where(parallel, np.nan, u_num / denom)
+
+    hit = (t >= -TOLERANCE) & (t <= 1 + TOLERANCE) & (u >= -TOLERANCE) & (u <= 1 + TOLERANCE)
+    at_end = (np.abs(t) <= TOLERANCE) | (np.abs(t - 1) <= TOLERANCE) | (np.abs(u) <= TOLERANCE) | (np.abs(u - 1) <= TOLERANCE)
+
+    # collinear edges touch when their projections on the subject edge overlap
+    collinear = parallel & (np.abs(t_num) <= TOLERANCE * r_length * np.maximum(s_length, np.hypot(qp[:, 0], qp[:, 1])))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t0 = (qp * r).sum(axis=1) / (r_length * r_length)
+        t1 = t0 + (s * r).sum(axis=1) / (r_length * r_length)
+    collinear &= (np.maximum(t0, t1) >= -TOLERANCE) & (np.minimum(t0, t1) <= 1 + TOLERANCE)
+
+    degenerate = (hit & at_end) | collinear
+    touching = np.unique(np.concatenate([a[degenerate], (a[degenerate] + 1) % len(subject)]))
+    crossing = hit & ~at_end
+    return a[crossing], b[crossing], t[crossing], u[crossing], touching
+
+# positions of the vertices and crossings in the ring order of one polygon; crossing j
+# lies on edge[j] at parameter[j]. Returns the position of every vertex and crossing
+def _ring_positions(edge, parameter, count):
+    order = np.lexsort((parameter, edge))
+    crossing_position = np.empty(len(edge), dtype=np.int64)
+    crossing_position[order] = edge[order] + 1 + np.arange(len(edge))
+    vertex_position = np.arange(count) + np.searchsorted(edge[order], np.arange(count), 'left')
+    return vertex_position, crossing_position, order
+
+# merged ring of vertices and crossings as coordinate lists and a crossing id per
+# entry, -1 for the polygon's own vertices
+def _merge_ring(ring, points, vertex_position, crossing_position):
+    size = len(ring) + len(points)
+    merged = np.empty((size, 2), dtype=np.float64)
+    ids = np.full(size, -1, dtype=np.int64)
+    merged[vertex_position] = ring
+    merged[crossing_position] = points
+    ids[crossing_position] = np.arange(len(points))
+    return merged.tolist(), ids.tolist()
+
+# intersection of the subject and clip polygons as a list of (K, 2) rings. Vertices
+# of the subject that touch the clip boundary are moved by a tiny offset until every
+# crossing is proper, the degeneracy handling proposed with the original algorithm
+def greiner_hormann_clip(subject, clip) -> list:
+    subject, clip = _clean_ring(subject), _clean_ring(clip)
+    if len(subject) < 3 or len(clip) < 3:
+        return []
+
+    extent = float(np.ptp(np.concatenate([subject, clip]), axis=0).max()) or 1.0
+    random = np.random.default_rng(0)
+    for attempt in range(MAX_PERTURBATIONS):
+        a, b, t, u, touching = _intersections(subject, clip)
+        if not len(touching) and len(a) % 2 == 0:
+            break
+        if not len(touching):
+            touching = np.unique(np.concatenate([a, (a + 1) % len(subject)]))
+        subject = subject.copy()
+        subject[touching] += random.uniform(-1, 1, (len(touching), 2)) * PERTURBATION * extent
+    else:
+        raise ValueError("polygons stay degenerate after perturbing the touching vertices")
+
+    # without crossings one polygon is inside the other or they are disjoint
+    if not len(a):
+        if point_in_polygon(subject[0, 0], subject[0, 1], clip):
+            return [subject]
+        if point_in_polygon(clip[0, 0], clip[0, 1], subject):
+            return [clip]
+        return []
+
+    points = subject[a] + t[:, None] * (subject[(a + 1) % len(subject)] - subject[a])
+    s_vertex, s_crossing, s_order = _ring_positions(a, t, len(subject))
+    c_vertex, c_crossing, c_order = _ring_positions(b, u, len(clip))
+
+    # crossings alternate between entering and leaving the other polygon along a ring
+    s_entry = np.empty(len(a), dtype=bool)
+    s_entry[s_order] = (np.arange(len(a)) % 2 == 0) != point_in_polygon(subject[0, 0], subject[0, 1], clip)
+    c_entry = np.empty(len(a), dtype=bool)
+    c_entry[c_order] = (np.arange(len(a)) % 2 == 0) != point_in_polygon(clip[0, 0], clip[0, 1], subject)
+
+    rings = (_merge_ring(subject, points, s_vertex, s_crossing) + (s_crossing.tolist(), s_entry.tolist()),
+             _merge_ring(clip, points, c_vertex, c_crossing) + (c_crossing.tolist(), c_entry.tolist()))
+
+    # walk forward from entering crossings and backward from leaving ones, switching
+    # polygons at every crossing until the piece closes
+    visited = [False] * len(a)
+    pieces = []
+    for start in s_order.tolist():
+        if visited[start]:
+            continue
+        piece = []
+        crossing, ring = start, 0
+        while not visited[crossing]:
+            visited[crossing] = True
+            merged, ids, position, entry = rings[ring]
+            piece.append(merged[position[crossing]])
+            step = 1 if entry[crossing] else -1
+            i = (position[crossing] + step) % len(merged)
+            while ids[i] < 0:
+                piece.append(merged[i])
+                i = (i + step) % len(merged)
+            crossing, ring = ids[i], 1 - ring
+        pieces.append(np.array(piece, dtype=np.float64))
+    return pieces
@@ -1,3 +1,4 @@
+import os
 import sys
 from PySide6.QtWidgets import QApplication, QMainWindow, QFileDialog, QPushButton, QToolBar
 import matplotlib
@@ -5,25 +6,50 @@ matplotlib.use('QtAgg')
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 from matplotlib.patches import Rectangle
+from matplotlib.widgets import RectangleSelector
+from matplotlib.collections import LineCollection
 from matplotlib import pyplot as plt
 import numpy as np
 import random as rand
+# geometry and segment_file live in the common directory shared with lab 4
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'common'))
 from polygon_clip import *
-
-# function to perform the line clipping and render the results on the matplotlib figure
-def clip_and_render(poly, viewport, ax : plt.Axes):
-    clipped_lines = sutherland_clip(poly, viewport)
-
-    for line in poly:
-        # render the original line in dashed style
-        ax.plot([line.x1, line.x2], [line.y1, line.y2], color='gray')
-
-    for clipped_line in clipped_lines:
-        # render the clipped line in solid style
-        ax.plot([clipped_line.x1, clipped_line.x2], [clipped_line.y1, clipped_line.y2], linewidth=4, color="blue")
-
-    # render the viewport rectangle
-    ax.add_patch(Rectangle((viewport.xmin, viewport.ymin), viewport.xmax - viewport.xmin, viewport.ymax - viewport.ymin, fill=None, linewidth=2, color='r'))
+from greiner_hormann import greiner_hormann_clip, viewport_ring
+from segment_file import is_segment_file, load_segment_file, parse_segment_rows
+
+# function to perform the polygon clipping and render the results on the matplotlib
+# figure. The polygon is given by its chained (N, 4) edge segments, so their start
+# points are the vertex ring. The polygon edges and the clipped edges are drawn as one
+# LineCollection each, the clipped ones colored per edge from `colors` (blue when not
+# given); passing the artists returned by an earlier call only replaces the clipped
+# lines and the viewport rectangle, the original lines stay as they are
+def clip_and_render(segments, viewport, ax : plt.Axes, colors = None, artists = None):
+    # every separate piece of the clipped polygon is closed on its own, so concave
+    # input has no connecting edges along the viewport border
+    try:
+        pieces = greiner_hormann_clip(segments[:, :2], viewport_ring(viewport))
+        clipped = as_segments([line for piece in pieces for line in polygon_edges(piece.tolist())])
+    except ValueError:
+        # input that stays degenerate after perturbing falls back to Sutherland-Hodgman,
+        # which always clips but joins the pieces along the border
+        clipped = as_segments(sutherland_clip(LineArray.from_segments(segments), viewport))
+    clipped_colors = 'blue' if colors is None else colors
+
+    if artists is None:
+        original_lines = LineCollection(segments.reshape(-1, 2, 2), colors='gray')
+        clipped_lines = LineCollection(clipped.reshape(-1, 2, 2), linewidths=4, colors=clipped_colors)
+        # render the viewport rectangle
+        rectangle = Rectangle((viewport.xmin, viewport.ymin), viewport.xmax - viewport.xmin, viewport.ymax - viewport.ymin, fill=None, linewidth=2, color='r')
+        ax.add_collection(original_lines, autolim=False)
+        ax.add_collection(clipped_lines, autolim=False)
+        ax.add_patch(rectangle)
+        return original_lines, clipped_lines, rectangle
+
+    original_lines, clipped_lines, rectangle = artists
+    clipped_lines.set_segments(clipped.reshape(-1, 2, 2))
+    clipped_lines.set_color(clipped_colors)
+    rectangle.set_bounds(viewport.xmin, viewport.ymin, viewport.xmax - viewport.xmin, viewport.ymax - viewport.ymin)
+    return artists
 
 class CustomCanvas(FigureCanvas):
     def __init__(self, parent=None, width=5, height=4, dpi=100):
@@ -32,17 +58,14 @@ class CustomCanvas(FigureCanvas):
         super().__init__(fig)
         self.setParent(parent)
 
-        self.rescale([], Viewport(0,0,10,10))
-
-    def rescale(self, lines : list[Line], viewport : Viewport):
-        if lines:
-            lines_x = [line.x1 for line in lines]
-            lines_x.extend([line.x2 for line in lines])
-            lines_y = [line.y1 for line in lines]
-            lines_y.extend([line.y2 for line in lines])
+        self.rescale(Viewport(0,0,10,10))
 
-            self.x_min, self.x_max = min(viewport.xmin, min(lines_x)), max(viewport.xmax, max(lines_x))
-            self.y_min, self.y_max = min(viewport.ymin, min(lines_y)), max(viewport.ymax, max(lines_y))
+    # bounds are the (xmin, ymin, xmax, ymax) of the loaded segments as computed once by
+    # segment_bounds, None when nothing is loaded
+    def rescale(self, viewport : Viewport, bounds = None):
+        if bounds is not None:
+            self.x_min, self.x_max = min(viewport.xmin, bounds[0]), max(viewport.xmax, bounds[2])
+            self.y_min, self.y_max = min(viewport.ymin, bounds[1]), max(viewport.ymax, bounds[3])
         else:
             self.x_min, self.x_max = viewport.xmin, viewport.xmax
             self.y_min, self.y_max = viewport.ymin, viewport.ymax
@@ -65,36 +88,81 @@ class MainWindow(QMainWindow):
         self.button = QPushButton('Open File')
         self.button.clicked.connect(self.open_file)
 
-        # create the toolbar and add the button to it
+        # the viewport button lets a rectangle dragged on the plot become the viewport
+        self.viewport_button = QPushButton('Set Viewport')
+        self.viewport_button.setEnabled(False)
+        self.viewport_button.clicked.connect(self.select_viewport)
+        self.selector = None
+
+        # create the toolbar and add the buttons to it
         toolbar = QToolBar()
         toolbar.addWidget(self.button)
+        toolbar.addWidget(self.viewport_button)
 
         # add the figure canvas and toolbar to the main window
         self.addToolBar(toolbar)
         self.setCentralWidget(self.canvas)
         
-    # function to read the file and return a list of lines and a viewport object
+    # function to read the file and return its (N, 4) edge segments and a viewport object
     def read_file(self, filename):
+        # binary segment files are memory mapped instead of parsed and their (N, 4)
+        # record array is used as the edges
+        if is_segment_file(filename):
+            segments, (xmin, ymin, xmax, ymax) = load_segment_file(filename)
+            return segments, Viewport(xmin, ymin, xmax, ymax)
+
         with open(filename, 'r') as f:
             n = int(f.readline())
-            lines = []
-            for i in range(n):
-                x1, y1, x2, y2 = [float(x) for x in f.readline().split()]
-                lines.append(Line(x1, y1, x2, y2))
+            rows = [f.readline() for i in range(n)]
+            segments = parse_segment_rows(rows, filename) if n else np.empty((0, 4), dtype=np.float64)
             xmin, ymin, xmax, ymax = [float(x) for x in f.readline().split()]
             viewport = Viewport(xmin, ymin, xmax, ymax)
-        return lines, viewport
+        return segments, viewport
 
     # function to open the file dialog and read the selected file
     def open_file(self):
-        filename, _ = QFileDialog.getOpenFileName(self, 'Open File', '.', 'Text Files (*.txt)')
+        filename, _ = QFileDialog.getOpenFileName(self, 'Open File', '.', 'Text Files (*.txt);;Segment Files (*.seg)')
         if filename:
-            lines, viewport = self.read_file(filename)
-            
+            segments, viewport = self.read_file(filename)
+
+            self.segments = segments
+            # the bounds are computed once per loaded file and reused on every view reset
+            self.bounds = segment_bounds(segments)
+            self.stop_selecting()
             self.canvas.axes.clear()
-            self.canvas.rescale(lines, viewport)
-            clip_and_render(lines, viewport, self.canvas.axes)
+            self.canvas.rescale(viewport, self.bounds)
+            self.artists = clip_and_render(segments, viewport, self.canvas.axes)
             self.canvas.draw()
+            self.viewport_button.setEnabled(True)
+
+    # clip the loaded polygon against another viewport, reusing the rendered collections
+    def set_viewport(self, viewport : Viewport):
+        self.canvas.rescale(viewport, self.bounds)
+        self.artists = clip_and_render(self.segments, viewport, self.canvas.axes, artists=self.artists)
+        self.canvas.draw_idle()
+
+    # wait for one rectangle to be dragged on the plot
+    def select_viewport(self):
+        if self.selector is not None:
+            return
+        self.selector = RectangleSelector(self.canvas.axes, self.viewport_selected, button=[1], props=dict(fill=False, edgecolor='r', linestyle='--'))
+
+    def stop_selecting(self):
+        if self.selector is not None:
+            self.selector.disconnect_events()
+            for artist in self.selector.artists:
+                artist.remove()
+            self.selector = None
+
+    def viewport_selected(self, press, release):
+        self.stop_selecting()
+        xmin, xmax = sorted((press.xdata, release.xdata))
+        ymin, ymax = sorted((press.ydata, release.ydata))
+        # a click without dragging keeps the viewport
+        if xmin < xmax and ymin < ymax:
+            self.set_viewport(Viewport(xmin, ymin, xmax, ymax))
+        else:
+            self.canvas.draw_idle()
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -1,87 +1,134 @@
 from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
 
-class Viewport:
-    def __init__(self, xmin, ymin, xmax, ymax):
-        self.xmin, self.ymin = xmin, ymin
-        self.xmax, self.ymax = xmax, ymax
-
-class Line:
-    def __init__(self, x1: float, y1: float, x2: float, y2: float):
-        self.x1 = x1
-        self.y1 = y1
-        self.x2 = x2
-        self.y2 = y2
-    
-    def intersect(self, other: Line) -> list[float]:
-        # Calculate the slopes of the two lines
-        slope_self = (self.y2 - self.y1) / (self.x2 - self.x1) if self.x2 - self.x1 != 0 else float('inf')
-        slope_other = (other.y2 - other.y1) / (other.x2 - other.x1) if other.x2 - other.x1 != 0 else float('inf')
-
-        # Check if the lines are parallel
-        if slope_self == slope_other:
-            return []
-
-        # Calculate the intersection point (x,y) of the two lines
-        if slope_self == float('inf'):  # self line is vertical
-            x = self.x1
-            y = slope_other * (x - other.x1) + other.y1
-        elif slope_other == float('inf'):  # other line is vertical
-            x = other.x1
-            y = slope_self * (x - self.x1) + self.y1
-        else:  # neither line is vertical
-            x = (other.y1 - self.y1 + slope_self * self.x1 - slope_other * other.x1) / (slope_self - slope_other)
-            y = slope_self * (x - self.x1) + self.y1
-
-        # Check if the intersection point lies within the segments of both lines
-        # if not (min(self.x1, self.x2) <= x <= max(self.x1, self.x2) and
-        #         min(self.y1, self.y2) <= y <= max(self.y1, self.y2) and
-        #         min(other.x1, other.x2) <= x <= max(other.x1, other.x2) and
-        #         min(other.y1, other.y2) <= y <= max(other.y1, other.y2)):
-        #     return []
-
-        # Return the intersection point as a list of two floats
-        return [x, y]
-    
-def compute_code(x : float, y : float, v : Viewport) -> int:
-        code = 0b0000
-
-        if x < v.xmin:
-            code |= 0b0001
-        elif x > v.xmax:
-            code |= 0b0010
-
-        if y < v.ymin:
-            code |= 0b0100
-        elif y > v.ymax:
-            code |= 0b1000
-
-        return code
+# the Line and Viewport classes are shared with the other labs
+from geometry import Line, Viewport, LineArray, as_segments, segment_bounds
+
+# the clip boundaries in pipeline order (left, top, right, bottom) as the axis they
+# bound, 0 for x and 1 for y, and the sign of their inside half plane
+BOUNDARIES = ((0, 1), (1, -1), (0, -1), (1, 1))
+
+# point where the edge a -> b crosses the axis aligned boundary axis = bound
+def _crossing(a, b, axis, bound):
+    if axis == 0:
+        return (bound, a[1] + (b[1] - a[1]) * (bound - a[0]) / (b[0] - a[0]))
+    return (a[0] + (b[0] - a[0]) * (bound - a[1]) / (b[1] - a[1]), bound)
+
+# Sutherland-Hodgman in its reentrant form: the vertex ring is streamed once through
+# the four boundary stages, every stage keeping only its first and previous vertex and
+# handing its output vertices straight to the next stage. Takes an (N, 2) array or a
+# sequence of x, y vertices and returns the clipped ring as an (M, 2) array
+def clip_polygon(vertices, v : Viewport):
+    import numpy as np
+    bounds = (v.xmin, v.ymax, v.xmax, v.ymin)
+    first = [None] * 4
+    previous = [None] * 4
+    was_inside = [False] * 4
+    output = []
+
+    # edge previous -> point of a stage: the boundary crossing if there is one, then
+    # the point itself when it is inside
+    def push(stage, point):
+        if stage == 4:
+            output.append(point)
+            return
+        axis, sign = BOUNDARIES[stage]
+        bound = bounds[stage]
+        inside = sign * (point[axis] - bound) >= 0
+        if previous[stage] is None:
+            first[stage] = point
+        elif inside != was_inside[stage]:
+            push(stage + 1, _crossing(previous[stage], point, axis, bound))
+        previous[stage], was_inside[stage] = point, inside
+        if inside:
+            push(stage + 1, point)
+
+    for point in np.asarray(vertices, dtype=np.float64).reshape(-1, 2).tolist():
+        push(0, point)
+
+    # close the ring of every stage in order; the previous -> first edge only adds a crossing
+    for stage in range(4):
+        if previous[stage] is None:
+            break
+        axis, sign = BOUNDARIES[stage]
+        if was_inside[stage] != (sign * (first[stage][axis] - bounds[stage]) >= 0):
+            push(stage + 1, _crossing(previous[stage], first[stage], axis, bounds[stage]))
+
+    return np.array(output, dtype=np.float64).reshape(-1, 2)
+
+# closed ring of edges through the vertices
+def polygon_edges(vertices) -> list[Line]:
+    points = [tuple(point) for point in vertices]
+    return [Line(x1, y1, x2, y2) for (x1, y1), (x2, y2) in zip(points, points[1:] + points[:1])]
 
 def sutherland_clip(poly: list[Line], v : Viewport) -> list[Line]:
-    xmin, ymin, xmax, ymax = v.xmin, v.ymin, v.xmax, v.ymax
-
-    # Iterate over each edge of the viewport and clip the polygon against it
-    borders = [Line(xmin, ymin, xmin, ymax), Line(xmin, ymax, xmax, ymax), Line(xmax, ymax, xmax, ymin), Line(xmax, ymin, xmin, ymin)]
-    border_codes = [0b0001, 0b1000, 0b0010, 0b0100]
-    for border, border_code in zip(borders, border_codes):
-        # Clip the polygon against the edge
-        new_vertex = []
-        for edge in poly:
-            # Check if the start point is visible
-            start_code = compute_code(edge.x1, edge.y1, v)
-            if start_code & border_code == 0:
-                new_vertex.append([edge.x1, edge.y1])
-
-            end_code = compute_code(edge.x2, edge.y2, v)
-            # Check if the edge intersects the viewport edge
-            if (start_code ^ end_code) & border_code > 0:
-                intersection = edge.intersect(border)
-                if intersection:
-                    new_vertex.append(intersection)
-
-        poly = []
-        mod = len(new_vertex)
-        for i in range(len(new_vertex)):
-            poly.append(Line(new_vertex[i][0], new_vertex[i][1], new_vertex[(i+1) % mod][0], new_vertex[(i+1) % mod][1]))
-
-    return poly
+    # the edges are chained, so their start points are the vertex ring
+    return polygon_edges(clip_polygon([(edge.x1, edge.y1) for edge in poly], v).tolist())
+
+# Polygon batches use a ragged layout: the vertices of all polygons in one (V, 2)
+# array and P + 1 offsets, polygon i owning vertices[offsets[i]:offsets[i + 1]]
+
+# clip every polygon of a ragged batch, returning the clipped rings in order
+def _clip_polygon_range(vertices, offsets, bounds):
+    viewport = Viewport(*bounds)
+    return [clip_polygon(vertices[start:end], viewport) for start, end in zip(offsets[:-1], offsets[1:])]
+
+def _clip_polygon_batch(args):
+    return _clip_polygon_range(*args)
+
+# clip many polygons against one viewport. Polygons whose bounding box is inside the
+# viewport are kept as they are and polygons whose box misses it are dropped; only the
+# ones straddling a border go through clip_polygon, split in batches of
+# polygons_per_batch over `workers` processes when workers > 1. Returns the clipped
+# polygons in the same (vertices, offsets) layout, rejected polygons left empty
+def clip_polygons_batch(vertices, offsets, v : Viewport, workers = 1, polygons_per_batch = 4096):
+    import numpy as np
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 2)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    counts = np.diff(offsets)
+
+    # bounding boxes of the non empty polygons
+    inside = np.zeros(len(counts), dtype=bool)
+    straddle = np.zeros(len(counts), dtype=bool)
+    filled = np.nonzero(counts)[0]
+    if len(filled):
+        starts = offsets[filled]
+        xmin, ymin = np.minimum.reduceat(vertices[:, 0], starts), np.minimum.reduceat(vertices[:, 1], starts)
+        xmax, ymax = np.maximum.reduceat(vertices[:, 0], starts), np.maximum.reduceat(vertices[:, 1], starts)
+        overlap = (xmin <= v.xmax) & (xmax >= v.xmin) & (ymin <= v.ymax) & (ymax >= v.ymin)
+        contained = (xmin >= v.xmin) & (xmax <= v.xmax) & (ymin >= v.ymin) & (ymax <= v.ymax)
+        inside[filled] = contained
+        straddle[filled] = overlap & ~contained
+
+    # the straddling polygons as their own ragged batch
+    clip_ids = np.nonzero(straddle)[0]
+    clip_owner = np.repeat(np.arange(len(clip_ids)), counts[clip_ids])
+    clip_offsets = np.concatenate([[0], np.cumsum(counts[clip_ids])])
+    clip_vertices = vertices[offsets[clip_ids][clip_owner] + np.arange(len(clip_owner)) - clip_offsets[clip_owner]]
+
+    bounds = (v.xmin, v.ymin, v.xmax, v.ymax)
+    if workers <= 1 or len(clip_ids) <= polygons_per_batch:
+        rings = _clip_polygon_range(clip_vertices, clip_offsets, bounds)
+    else:
+        rings = []
+        batches = []
+        for first in range(0, len(clip_ids), polygons_per_batch):
+            batch_offsets = clip_offsets[first:first + polygons_per_batch + 1]
+            batches.append((clip_vertices[batch_offsets[0]:batch_offsets[-1]], batch_offsets - batch_offsets[0], bounds))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for batch_rings in executor.map(_clip_polygon_batch, batches):
+                rings.extend(batch_rings)
+
+    # kept polygons are copied whole, clipped ones take their ring's length
+    out_counts = np.where(inside, counts, 0)
+    out_counts[clip_ids] = [len(ring) for ring in rings]
+    out_offsets = np.concatenate([[0], np.cumsum(out_counts)])
+    out_vertices = np.empty((out_offsets[-1], 2), dtype=np.float64)
+
+    kept = np.nonzero(inside)[0]
+    owner = np.repeat(kept, counts[kept])
+    step = np.arange(len(owner)) - np.repeat(np.cumsum(counts[kept]) - counts[kept], counts[kept])
+    out_vertices[out_offsets[owner] + step] = vertices[offsets[owner] + step]
+    for polygon, ring in zip(clip_ids, rings):
+        out_vertices[out_offsets[polygon]:out_offsets[polygon + 1]] = ring
+    return out_vertices, out_offsets
@@ -0,0 +1,100 @@
+from __future__ import annotations
+import math
+from concurrent.futures import ProcessPoolExecutor
+from polygon_clip import Line
+
+# Enum for fill rules
+class FillRule:
+    EvenOdd = 0
+    NonZero = 1
+
+# build the edge table: one entry (row_start, row_end, x, dxdy, y_start, winding) per
+# non-horizontal edge. Cell row r is sampled at y = r + 0.5 and an edge covers
+# the rows whose sample lies in [y_low, y_high)
+def build_edge_table(poly: list[Line]) -> list[tuple]:
+    edges = []
+    for edge in poly:
+        if edge.y1 == edge.y2:
+            continue
+        winding = 1 if edge.y2 > edge.y1 else -1
+        (x_low, y_low), (x_high, y_high) = sorted([(edge.x1, edge.y1), (edge.x2, edge.y2)], key=lambda p: p[1])
+
+        row_start = math.ceil(y_low - 0.5)
+        row_end = math.ceil(y_high - 0.5) - 1
+        if row_start > row_end:
+            continue
+        dxdy = (x_high - x_low) / (y_high - y_low)
+        edges.append((row_start, row_end, x_low, dxdy, y_low, winding))
+
+    edges.sort()
+    return edges
+
+# spans (y, x_start, x_end) for the rows [row_start, row_end] using an active edge list
+def fill_rows(edges: list[tuple], row_start: int, row_end: int, rule: int = FillRule.EvenOdd) -> list[tuple]:
+    spans = []
+    active = []
+    next_edge = 0
+
+    # edges that started before this band are entered at their x for the first row
+    while next_edge < len(edges) and edges[next_edge][0] < row_start:
+        first_row, last_row, x, dxdy, y_low, winding = edges[next_edge]
+        if last_row >= row_start:
+            active.append([x + dxdy * (row_start + 0.5 - y_low), dxdy, last_row, winding])
+        next_edge += 1
+
+    for row in range(row_start, row_end + 1):
+        # move the edges starting on this row from the edge table to the active list
+        while next_edge < len(edges) and edges[next_edge][0] == row:
+            first_row, last_row, x, dxdy, y_low, winding = edges[next_edge]
+            active.append([x + dxdy * (row + 0.5 - y_low), dxdy, last_row, winding])
+            next_edge += 1
+
+        active = [edge for edge in active if edge[2] >= row]
+        active.sort(key=lambda edge: edge[0])
+
+        # collect the [x_enter, x_leave) intervals that are inside according to the rule
+        count = 0
+        x_enter = None
+        for x, _, _, winding in active:
+            inside = count != 0 if rule == FillRule.NonZero else count % 2 == 1
+            count += winding if rule == FillRule.NonZero else 1
+            now_inside = count != 0 if rule == FillRule.NonZero else count % 2 == 1
+            if now_inside and not inside:
+                x_enter = x
+            elif inside and not now_inside:
+                # cells whose centers are in [x_enter, x)
+                x_start = math.ceil(x_enter - 0.5)
+                x_end = math.ceil(x - 0.5) - 1
+                if x_start <= x_end:
+                    spans.append((row, x_start, x_end))
+
+        for edge in active:
+            edge[0] += edge[1]
+
+        if not active and next_edge == len(edges):
+            break
+
+    return spans
+
+def _fill_band(args):
+    return fill_rows(*args)
+
+# scanline fill of a polygon given as a list of edges, returns spans (y, x_start, x_end);
+# with workers > 1 the rows are split in bands that are filled in separate processes
+def scanline_fill(poly: list[Line], rule: int = FillRule.EvenOdd, workers: int = 1, band_height: int = 256) -> list[tuple]:
+    edges = build_edge_table(poly)
+    if not edges:
+        return []
+
+    row_start = edges[0][0]
+    row_end = max(edge[1] for edge in edges)
+    if workers <= 1 or row_end - row_start + 1 <= band_height:
+        return fill_rows(edges, row_start, row_end, rule)
+
+    bands = [(edges, start, min(start + band_height - 1, row_end), rule)
+             for start in range(row_start, row_end + 1, band_height)]
+    spans = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for band_spans in executor.map(_fill_band, bands):
+            spans.extend(band_spans)
+    return spans